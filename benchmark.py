@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Benchmarks
+Generates synthetic notebook and text corpora and times the converter and
+merger on them. Results are printed and can be written as JSON so runs from
+different commits can be compared:
+
+    python benchmark.py -o before.json
+    python benchmark.py -o after.json --compare before.json
+"""
+
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Cold-start budget: time added on top of a bare interpreter start by
+# importing the library modules or running the command-line tool, in ms.
+# Neither path may import tkinter.
+STARTUP_BUDGET_MS = 50
+STARTUP_RUNS = 15
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Each case runs in a fresh process so peak RSS is attributable to it.
+# Sizes are multiplied by --scale.
+CASES = [
+    {'name': 'extract-small', 'kind': 'extract', 'files': 200, 'cells': 30,
+     'source_len': 400, 'output_size': 0},
+    {'name': 'extract-large-outputs', 'kind': 'extract', 'files': 10, 'cells': 40,
+     'source_len': 400, 'output_size': 1 << 20},
+    {'name': 'extract-large-outputs-streamed', 'kind': 'extract', 'files': 10, 'cells': 40,
+     'source_len': 400, 'output_size': 1 << 20, 'mmap': False},
+    {'name': 'extract-html-outputs', 'kind': 'extract', 'files': 20, 'cells': 40,
+     'source_len': 400, 'output_size': 1 << 18, 'output_kind': 'html'},
+    {'name': 'extract-string-source', 'kind': 'extract', 'files': 200, 'cells': 30,
+     'source_len': 400, 'output_size': 0, 'source_list': False},
+    {'name': 'save-as-text', 'kind': 'save', 'files': 200, 'cells': 30,
+     'source_len': 400, 'output_size': 0},
+    {'name': 'startup-library', 'kind': 'startup', 'files': 0,
+     'command': ['-c', "import sys, converter_core, merger_core, ipynb_to_text_converter, "
+                       "text_file_merger; sys.exit('tkinter' in sys.modules)"]},
+    {'name': 'startup-cli', 'kind': 'startup', 'files': 0,
+     'command': [os.path.join(REPO_DIR, 'ipynb_to_text_converter.py'), '--help']},
+    {'name': 'merge-many-small', 'kind': 'merge', 'files': 2000, 'file_size': 4 << 10,
+     'repeat': 5},
+    {'name': 'merge-few-large', 'kind': 'merge', 'files': 4, 'file_size': 64 << 20,
+     'repeat': 3},
+    {'name': 'merge-gzip-output', 'kind': 'merge', 'files': 200, 'file_size': 64 << 10,
+     'repeat': 3, 'output': 'merged.txt.gz'},
+]
+
+def _random_text(rng, length):
+    """Return code-like text of roughly the given length."""
+    words = ["import", "def", "return", "for", "in", "if", "x", "y", "data", "plot",
+             "np.array", "df['col']", "print(", ")", "=", "+", "\"text\"", "\\n"]
+    lines = []
+    size = 0
+    while size < length:
+        line = " ".join(rng.choice(words) for _ in range(rng.randint(3, 10)))
+        lines.append(line + "\n")
+        size += len(line) + 1
+    return "".join(lines)
+
+def _output_payload(rng, kind, size):
+    if kind == 'html':
+        row = "<tr><td class=\"cell\">%d</td><td>value</td></tr>\n"
+        return {"text/html": [row % i for i in range(size // len(row))]}
+    return {"image/png": base64.b64encode(rng.randbytes(size * 3 // 4)).decode('ascii')}
+
+def generate_notebook(path, rng, cells=30, source_len=400, output_size=0,
+                      output_kind='image', source_list=True):
+    """Write a synthetic notebook with alternating code and markdown cells."""
+    notebook_cells = []
+    for i in range(cells):
+        source = _random_text(rng, source_len)
+        if source_list:
+            source = source.splitlines(keepends=True)
+        if i % 3 == 2:
+            notebook_cells.append({"cell_type": "markdown", "metadata": {}, "source": source})
+            continue
+        outputs = []
+        if output_size:
+            outputs.append({"output_type": "display_data", "metadata": {},
+                            "data": _output_payload(rng, output_kind, output_size)})
+        notebook_cells.append({"cell_type": "code", "execution_count": i, "metadata": {},
+                               "outputs": outputs, "source": source})
+
+    notebook = {"cells": notebook_cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(notebook, f, indent=1)
+
+def generate_text_file(path, rng, size):
+    """Write a text file of roughly the given size."""
+    block = _random_text(rng, min(size, 1 << 16)).encode('utf-8')
+    with open(path, 'wb') as f:
+        written = 0
+        while written < size:
+            f.write(block[:size - written])
+            written += len(block)
+
+def generate_corpus(case, directory, seed=0):
+    """Create the input files for a case and return their paths."""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(case['files']):
+        if case['kind'] == 'startup':
+            break
+        if case['kind'] == 'merge':
+            path = os.path.join(directory, f"input_{i:06d}.txt")
+            generate_text_file(path, rng, case['file_size'])
+        else:
+            path = os.path.join(directory, f"notebook_{i:06d}.ipynb")
+            generate_notebook(path, rng, case['cells'], case['source_len'],
+                              case['output_size'], case.get('output_kind', 'image'),
+                              case.get('source_list', True))
+        paths.append(path)
+    return paths
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+def _time_startup(command):
+    """Time a Python command against a bare interpreter start.
+
+    Returns latencies (the extra time over the fastest bare start), 0 bytes and
+    the number of runs that exited with an error.
+    """
+    def run(args):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable] + args, cwd=REPO_DIR,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return time.perf_counter() - start, completed.returncode
+
+    bare = min(run(['-c', 'pass'])[0] for _ in range(STARTUP_RUNS))
+    latencies = []
+    errors = 0
+    for _ in range(STARTUP_RUNS):
+        elapsed, returncode = run(command)
+        latencies.append(max(elapsed - bare, 0.0))
+        errors += returncode != 0
+    return latencies, 0, errors
+
+def _time_case(case, paths, directory):
+    """Run one case and return its latencies, byte count and error count."""
+    import converter_core
+    from converter_core import extract_code_from_notebook, save_as_text, set_json_backend
+    from merger_core import merge_files
+
+    if case.get('json_backend'):
+        set_json_backend(case['json_backend'])
+    converter_core.MMAP_NOTEBOOKS = case.get('mmap', True)
+
+    latencies = []
+    total_bytes = 0
+    errors = 0
+
+    if case['kind'] == 'startup':
+        return _time_startup(case['command'])
+
+    if case['kind'] == 'merge':
+        output_path = os.path.join(directory, case.get('output', "merged.txt"))
+        input_bytes = sum(os.path.getsize(path) for path in paths)
+        for _ in range(case.get('repeat', 1)):
+            start = time.perf_counter()
+            merge_files(paths, output_path)
+            latencies.append(time.perf_counter() - start)
+            total_bytes += input_bytes
+        return latencies, total_bytes, errors
+
+    # Failed extractions are counted but not timed, so they can't pass for
+    # fast ones; any error fails the run
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            code = extract_code_from_notebook(path)
+        except Exception:
+            errors += 1
+            continue
+        elapsed = time.perf_counter() - start
+        if case['kind'] == 'extract':
+            latencies.append(elapsed)
+            total_bytes += os.path.getsize(path)
+        else:
+            output_path = os.path.splitext(path)[0] + ".txt"
+            start = time.perf_counter()
+            save_as_text(code, output_path)
+            latencies.append(time.perf_counter() - start)
+            total_bytes += os.path.getsize(output_path)
+    return latencies, total_bytes, errors
+
+def _run_case(case, paths, directory, results):
+    baseline_rss = _peak_rss_mb()
+    latencies, total_bytes, errors = _time_case(case, paths, directory)
+    total_time = sum(latencies)
+    result = {
+        'name': case['name'],
+        'kind': case['kind'],
+        'params': case,
+        'count': len(latencies),
+        'errors': errors,
+        'total_s': total_time,
+        'p50_ms': _percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p90_ms': _percentile(latencies, 0.90) * 1000 if latencies else None,
+        'p99_ms': _percentile(latencies, 0.99) * 1000 if latencies else None,
+        'max_ms': max(latencies) * 1000 if latencies else None,
+        'ops_per_s': len(latencies) / total_time if total_time else None,
+        'mb_per_s': total_bytes / total_time / 1e6 if total_time else None,
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+    if case['kind'] == 'startup':
+        result['budget_ms'] = STARTUP_BUDGET_MS
+        result['over_budget'] = result['p50_ms'] > STARTUP_BUDGET_MS
+    results.put(result)
+
+def run_case(case):
+    """Generate the corpus for a case, then time it in a fresh interpreter.
+
+    Returns the result dict. The corpus is generated in this process so that
+    the child's peak RSS only reflects the code being measured.
+    """
+    with tempfile.TemporaryDirectory(prefix="ipynb-bench-") as directory:
+        paths = generate_corpus(case, directory)
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        process = context.Process(target=_run_case, args=(case, paths, directory, results))
+        process.start()
+        result = results.get()
+        process.join()
+    return result
+
+def scale_case(case, scale):
+    scaled = dict(case)
+    for key in ('files', 'file_size', 'output_size'):
+        if scaled.get(key):
+            scaled[key] = max(1, int(scaled[key] * scale))
+    return scaled
+
+def backend_cases(cases):
+    """Return a copy of each extract case per installed JSON backend."""
+    from converter_core import available_json_backends
+
+    expanded = []
+    for case in cases:
+        if case['kind'] != 'extract':
+            expanded.append(case)
+            continue
+        for backend in available_json_backends():
+            expanded.append(dict(case, name=f"{case['name']}[{backend}]", json_backend=backend))
+    return expanded
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _format(value, pattern):
+    return "-" if value is None else pattern % value
+
+def print_result(result):
+    print(f"{result['name']:<36} n={result['count']:<5} "
+          f"p50={_format(result['p50_ms'], '%.2f')}ms "
+          f"p90={_format(result['p90_ms'], '%.2f')}ms "
+          f"p99={_format(result['p99_ms'], '%.2f')}ms "
+          f"{_format(result['ops_per_s'], '%.1f')} ops/s "
+          f"{_format(result['mb_per_s'], '%.1f')} MB/s "
+          f"rss={_format(result['peak_rss_mb'], '%.0f')}MB"
+          + (f" errors={result['errors']}" if result['errors'] else "")
+          + (f" OVER BUDGET ({result['budget_ms']}ms)" if result.get('over_budget') else ""))
+
+def compare(report, baseline, threshold):
+    """Print p50 and throughput changes against a baseline report.
+
+    Returns the names of cases whose p50 latency regressed by more than threshold.
+    """
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    for result in report['results']:
+        old = previous.get(result['name'])
+        if not old or not old['p50_ms'] or not result['p50_ms']:
+            continue
+        change = result['p50_ms'] / old['p50_ms'] - 1
+        marker = ""
+        if change > threshold:
+            marker = "  REGRESSION"
+            regressions.append(result['name'])
+        print(f"{result['name']:<36} p50 {change:+.1%}  "
+              f"MB/s {_format(old['mb_per_s'], '%.1f')} -> {_format(result['mb_per_s'], '%.1f')}"
+              f"{marker}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the notebook converter and text merger.")
+    parser.add_argument("-k", "--cases", nargs="+", metavar="NAME",
+                        help="only run cases whose name contains one of these strings")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply file counts and sizes by this factor")
+    parser.add_argument("--json-backends", action="store_true",
+                        help="run the extract cases once per installed JSON backend")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="compare against an earlier results file")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="p50 slowdown that counts as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    cases = [scale_case(case, args.scale) for case in CASES
+             if not args.cases or any(name in case['name'] for name in args.cases)]
+    if args.json_backends:
+        cases = backend_cases(cases)
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'results': [],
+    }
+    for case in cases:
+        result = run_case(case)
+        print_result(result)
+        report['results'].append(result)
+
+    failed = any(result.get('over_budget') or result['errors'] for result in report['results'])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
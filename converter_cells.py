@@ -0,0 +1,263 @@
+"""
+Cell selection and output formats for the notebook converter
+An Extractor decides which cells of a notebook are kept, how their text is
+transformed and how the kept cells are written: as plain text (the default,
+code cells only), as a percent-format .py script or as JSON lines. It is
+applied to the cells as the notebook is scanned, so any combination of
+filters and transforms still reads the notebook once.
+"""
+
+import json
+import re
+
+CELL_TYPES = ('code', 'markdown', 'raw')
+OUTPUT_FORMATS = ('text', 'py', 'jsonl')
+
+# IPython line and cell magics (%time, %%bash) and shell commands (!ls,
+# files = !ls), possibly indented. A '%' or '!' that can continue a Python
+# expression ('% 2', '!= x') is not a magic. Comments and string literals
+# are matched too, so that the lines of a triple-quoted string are skipped
+# as a whole rather than taken for magics. The pattern is left to re's cache,
+# so runs that don't strip magics never pay for compiling it.
+_MAGIC_LINE = r'^[ \t]*(?:\w+[ \t]*=[ \t]*)?(?:%%?[A-Za-z_]|![^=])[^\n]*(?:\n|$)'
+_LITERAL = (r'#[^\n]*|[rRbBuUfF]*(?:'
+            r"'''(?:[^\\]|\\.)*?(?:'''|\Z)|"
+            r'"""(?:[^\\]|\\.)*?(?:"""|\Z)|'
+            r"'(?:[^'\\\n]|\\.)*'|"
+            r'"(?:[^"\\\n]|\\.)*")')
+_MAGIC_OR_LITERAL = r'(?P<magic>%s)|%s' % (_MAGIC_LINE, _LITERAL)
+# A cell magic (%%bash) on the first line of a cell, and the ones whose body
+# is still Python; the body of any other (bash, html, sql, writefile, ...) is not
+_CELL_MAGIC = re.compile(r'\s*%%([A-Za-z_]\w*)')
+PYTHON_CELL_MAGICS = frozenset(('time', 'timeit', 'capture', 'prun', 'debug', 'python',
+                                'python3', 'memit'))
+
+class Cell:
+    """One notebook cell, as filters, transforms and writers see it.
+
+    index is the cell's position in the notebook, counting every cell from
+    0, and source its text. metadata is the cell's metadata dict, or None
+    when nothing in the Extractor uses it (see Extractor).
+    """
+
+    __slots__ = ('index', 'cell_type', 'source', 'metadata')
+
+    def __init__(self, index, cell_type, source, metadata=None):
+        self.index = index
+        self.cell_type = cell_type
+        self.source = source
+        self.metadata = metadata
+
+    def tags(self):
+        """Return the cell's tags (metadata['tags']), or an empty list."""
+        tags = self.metadata.get('tags') if isinstance(self.metadata, dict) else None
+        return tags if isinstance(tags, list) else []
+
+class TagFilter:
+    """Keeps cells that have any of tags; with exclude, drops them instead."""
+
+    uses_metadata = True
+
+    def __init__(self, tags, exclude=False):
+        self.tags = frozenset(tags)
+        self.exclude = exclude
+
+    def __call__(self, cell):
+        return self.tags.isdisjoint(cell.tags()) == self.exclude
+
+    def __repr__(self):
+        return f"TagFilter({sorted(self.tags)!r}, exclude={self.exclude!r})"
+
+def _drop_magic(match):
+    return '' if match.group('magic') is not None else match.group()
+
+def strip_magics(cell):
+    """Transform that removes IPython magic and shell command lines from code cells.
+
+    A cell that starts with a cell magic whose body isn't Python (%%bash,
+    %%html, %%writefile, ...) is dropped whole; for those in
+    PYTHON_CELL_MAGICS (%%time, %%capture, ...) only the magic line goes. A
+    code cell with nothing left but whitespace is dropped.
+    """
+    if cell.cell_type != 'code' or ('%' not in cell.source and '!' not in cell.source):
+        return cell.source
+    match = _CELL_MAGIC.match(cell.source)
+    if match is not None and match.group(1) not in PYTHON_CELL_MAGICS:
+        return None
+    source = re.sub(_MAGIC_OR_LITERAL, _drop_magic, cell.source, flags=re.M | re.S)
+    if not source.strip() and cell.source.strip():
+        return None
+    return source
+
+strip_magics.uses_metadata = False
+
+def _comment(text):
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return ''.join(f"# {line}\n" if line.strip() else "#\n" for line in lines)
+
+def comment_markdown(cell):
+    """Transform that turns markdown cells into '# ' comment lines."""
+    if cell.cell_type != 'markdown':
+        return cell.source
+    return _comment(cell.source)
+
+comment_markdown.uses_metadata = False
+
+def _with_newline(text):
+    return text + '\n' if text and not text.endswith('\n') else text
+
+class TextWriter:
+    """Writes cells as plain text separated by blank lines, the converter's default output.
+
+    With cell_markers, each cell is preceded by a "# Cell n" line, n being
+    its position in the notebook counting from 1.
+    """
+
+    suffix = '.txt'
+
+    def __init__(self, cell_markers=False):
+        self.cell_markers = cell_markers
+
+    def write(self, cells):
+        if self.cell_markers:
+            return '\n'.join(f"# Cell {cell.index + 1}\n{_with_newline(cell.source)}" for cell in cells)
+        return self.join(cell.source for cell in cells)
+
+    @staticmethod
+    def join(sources):
+        """Join cell sources, each ending in a newline, with blank lines between them."""
+        return '\n'.join([source + '\n' if source and not source.endswith('\n') else source
+                          for source in sources])
+
+    def __repr__(self):
+        return f"TextWriter(cell_markers={self.cell_markers!r})"
+
+class PercentWriter:
+    """Writes cells as a percent-format script: each starts with a "# %%" line.
+
+    Jupytext, VS Code, Spyder and PyCharm read this format back as cells.
+    Markdown and raw cells are written as comments under "# %% [markdown]"
+    or "# %% [raw]".
+    """
+
+    suffix = '.py'
+
+    def write(self, cells):
+        parts = []
+        for cell in cells:
+            if cell.cell_type == 'code':
+                parts.append(f"# %%\n{_with_newline(cell.source)}")
+            else:
+                parts.append(f"# %% [{cell.cell_type}]\n{_comment(cell.source)}")
+        return '\n'.join(parts)
+
+    def __repr__(self):
+        return "PercentWriter()"
+
+class JsonLinesWriter:
+    """Writes one JSON object per cell and line, with its index, type, tags and source."""
+
+    suffix = '.jsonl'
+    uses_metadata = True
+
+    def write(self, cells):
+        return ''.join(json.dumps({'index': cell.index, 'cell_type': cell.cell_type,
+                                   'tags': cell.tags(), 'source': cell.source},
+                                  ensure_ascii=False) + '\n'
+                       for cell in cells)
+
+    def __repr__(self):
+        return "JsonLinesWriter()"
+
+WRITERS = {'text': TextWriter, 'py': PercentWriter, 'jsonl': JsonLinesWriter}
+
+def _describe(part):
+    # Functions by name, so that the description is the same in every run
+    name = getattr(part, '__qualname__', None)
+    if name is not None:
+        return f"{part.__module__}.{name}"
+    return repr(part)
+
+class Extractor:
+    """Which cells of a notebook to keep, how to change them and how to write them.
+
+    Only cells whose type is in cell_types are read. Each filter is called
+    with a Cell and drops it by returning a false value; each transform is
+    called with a Cell and returns its new source, or None to drop it.
+    Filters run before transforms, each in the order given. writer (a
+    TextWriter by default) turns the kept cells into the output text and
+    names its file suffix.
+
+    Cell metadata is only read from the notebook when a filter or transform
+    doesn't set uses_metadata = False, or the writer sets it to True.
+
+    Extractors built from the filters, transforms and writers in this
+    module can be pickled, so they can be sent to worker processes.
+    """
+
+    def __init__(self, cell_types=('code',), filters=(), transforms=(), writer=None):
+        # A tuple rather than a set, as a malformed notebook's cell_type may be unhashable
+        self.cell_types = tuple(dict.fromkeys(cell_types))
+        self.filters = tuple(filters)
+        self.transforms = tuple(transforms)
+        self.writer = writer if writer is not None else TextWriter()
+        self.uses_metadata = (any(getattr(part, 'uses_metadata', True)
+                                  for part in self.filters + self.transforms)
+                              or getattr(self.writer, 'uses_metadata', False))
+        # What this extractor writes, None for the default; the conversion
+        # cache stores it so that changing the options reconverts notebooks
+        description = '; '.join([','.join(sorted(self.cell_types))]
+                                + [_describe(part) for part in self.filters + self.transforms]
+                                + [_describe(self.writer)])
+        self.key = None if description == _DEFAULT_DESCRIPTION else description
+
+    @property
+    def suffix(self):
+        return self.writer.suffix
+
+    def select(self, cells):
+        """Yield the cells that pass the filters, with the transforms applied."""
+        filters = self.filters
+        transforms = self.transforms
+        for cell in cells:
+            if filters and not all(keep(cell) for keep in filters):
+                continue
+            for transform in transforms:
+                cell.source = transform(cell)
+                if cell.source is None:
+                    break
+            else:
+                yield cell
+
+    def write(self, cells):
+        """Return the output text for the cells of one notebook."""
+        return self.writer.write(self.select(cells))
+
+_DEFAULT_DESCRIPTION = f"code; {TextWriter()!r}"
+
+def build_extractor(output_format='text', cell_types=('code',), tags=None, skip_tags=None,
+                    strip_magic_lines=False, markdown_comments=False, cell_markers=False):
+    """Build an Extractor from command-line style options.
+
+    tags keeps only cells with one of them, skip_tags drops cells with one of
+    them. markdown_comments applies to the text and jsonl formats; the py
+    format always writes markdown as comments. cell_markers applies to text.
+    """
+    if output_format not in WRITERS:
+        raise ValueError(f"Unknown output format {output_format!r}; expected one of {', '.join(OUTPUT_FORMATS)}")
+    filters = []
+    if tags:
+        filters.append(TagFilter(tags))
+    if skip_tags:
+        filters.append(TagFilter(skip_tags, exclude=True))
+    transforms = []
+    if strip_magic_lines:
+        transforms.append(strip_magics)
+    if markdown_comments and output_format != 'py':
+        transforms.append(comment_markdown)
+    writer = TextWriter(cell_markers) if output_format == 'text' else WRITERS[output_format]()
+    return Extractor(cell_types, filters, transforms, writer)
+
+DEFAULT_EXTRACTOR = Extractor()
\ No newline at end of file
@@ -0,0 +1,1310 @@
+"""
+Notebook conversion core
+Extracts the code cells of Jupyter notebooks and writes them as plain text.
+This module has no GUI dependencies; ipynb_to_text_converter.py builds the
+GUI and command-line tool on top of it.
+"""
+
+import contextlib
+import fnmatch
+import io
+import json
+import os
+import posixpath
+import re
+import threading
+import time
+
+from converter_cells import DEFAULT_EXTRACTOR, Cell, TextWriter
+from instrumentation import finish_record, lap, start_record
+
+# hashlib, glob, mmap and the codec and archive modules (gzip, bz2, lzma,
+# zstandard, tarfile, zipfile) are imported where they are first used: at
+# start-up they would cost more than everything imported above.
+
+# Notebooks can be hundreds of megabytes because of embedded outputs, so large
+# ones are scanned incrementally by the reader below instead of being parsed
+# whole.
+# JSON structural characters are all ASCII and never appear inside a UTF-8
+# multi-byte sequence, so it is safe to scan undecoded bytes.
+_CHUNK_SIZE = 1 << 16
+_NON_WHITESPACE = re.compile(rb'[^ \t\n\r]')
+_STRUCTURAL = re.compile(rb'["\[\]{}]')
+_SCALAR_END = re.compile(rb'[,\]} \t\n\r]')
+# Skipped values are checked against the JSON grammar as far as json.loads
+# would reject them for their own sake: scalars (it also reads NaN and
+# Infinity), escapes and control characters in strings. The punctuation
+# between them is not: commas, colons, and whether an object member is a key.
+_SCALAR = rb'(?:-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null|NaN|-?Infinity)'
+_SCALAR_VALUE = re.compile(_SCALAR)
+_STRING_CHARS = rb'[^"\\\x00-\x1f]'
+_ESCAPE = rb'\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})'
+# A string's contents from a backslash on, up to its closing quote
+_STRING_BODY = re.compile(rb'(?:%s+|%s)*' % (_STRING_CHARS, _ESCAPE))
+_CONTROL_FREE = bytes(range(0x20, 0x100))
+# Everything up to the next bracket that is either outside strings or in a
+# complete string of short runs, such as the lines of an HTML output.
+# Matching these in one regex call beats finding each quote in Python; long
+# strings (base64 images) stop it at once and are left to bytes.find. A
+# scalar must be followed by what can end it, so one cut off at the end of
+# the buffer is left for after the next read.
+_SHORT_STRINGS = re.compile(rb'(?:[ \t\n\r,:]+|"%s{0,1024}(?:%s%s{0,1024})*"|%s(?=[,\]} \t\n\r]))*'
+                            % (_STRING_CHARS, _ESCAPE, _STRING_CHARS, _SCALAR))
+
+# Notebooks up to this size are parsed in one go with the fastest available
+# JSON backend; larger ones are streamed with _NotebookReader. Below about a
+# megabyte a C parser beats the streaming scanner by an order of magnitude,
+# and the memory cost of materialising outputs is negligible.
+FULL_PARSE_MAX_BYTES = 1 << 20
+
+# Larger notebooks that are plain files on disk are memory-mapped and
+# scanned in place rather than read through _NotebookReader's buffer (see
+# _extract_mapped_code). Set to False to always stream them.
+MMAP_NOTEBOOKS = True
+
+# Optional JSON parsers for whole-notebook parsing, fastest first. Override
+# with set_json_backend() or the IPYNB_JSON_BACKEND environment variable.
+JSON_BACKENDS = ('orjson', 'simdjson', 'json')
+
+# Directories never searched for notebooks when converting a tree
+SKIP_DIRECTORIES = {'.ipynb_checkpoints'}
+
+# Conversion manifest written next to the outputs (see ConversionCache)
+CACHE_FILE_NAME = ".ipynb_to_text_cache.json"
+CACHE_MAX_ENTRIES = 100000
+
+# What write_converted does with a notebook whose code was already written
+# for another one in the same run (see DuplicateOutputs)
+DEDUP_MODES = ('skip', 'reference')
+
+# Compressed inputs and outputs are recognised by suffix and streamed through
+# these codecs (see open_compressed); zstd needs the optional zstandard package.
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+COMPRESSION_CODECS = tuple(COMPRESSION_SUFFIXES.values())
+DEFAULT_COMPRESSION_LEVELS = {'gzip': 6, 'bz2': 9, 'xz': 6, 'zstd': 3}
+NOTEBOOK_SUFFIX = '.ipynb'
+
+# Archives whose members can be converted or merged in place; a member is
+# addressed as "<archive>::<member name>" (see member_path)
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+ARCHIVE_MEMBER_SEPARATOR = '::'
+
+class _NotebookReader:
+    """Incremental JSON scanner over the raw bytes of a notebook file.
+
+    Only values requested with read_value() are decoded into Python objects;
+    everything else is skipped in place, so memory use is bounded by the read
+    chunk size plus the largest value actually kept.
+    """
+
+    def __init__(self, f, chunk_size=_CHUNK_SIZE, prefix=b''):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._buf = bytearray(prefix)  # bytes already read from f
+        self._pos = 0
+        self._offset = 0   # file offset of self._buf[0], for error messages
+        self._keep = None  # buffer index of a value being captured
+
+    def _fill(self):
+        """Drop consumed bytes and read the next chunk. Returns False at EOF."""
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            return False
+        start = self._pos if self._keep is None else self._keep
+        if start:
+            del self._buf[:start]
+            self._offset += start
+            self._pos -= start
+            if self._keep is not None:
+                self._keep = 0
+        self._buf += chunk
+        return True
+
+    def _error(self, message):
+        return ValueError(f"{message} (near byte {self._offset + self._pos})")
+
+    def _more(self):
+        if not self._fill():
+            raise self._error("Unexpected end of file")
+
+    def peek(self):
+        """Return the next non-whitespace byte without consuming it."""
+        while True:
+            match = _NON_WHITESPACE.search(self._buf, self._pos)
+            if match:
+                self._pos = match.start()
+                return self._buf[self._pos:self._pos + 1]
+            self._pos = len(self._buf)
+            self._more()
+
+    def expect(self, token):
+        if self.peek() != token:
+            raise self._error(f"Expected {token.decode()!r}")
+        self._pos += 1
+
+    def _check_control_free(self, start, end):
+        # bytes.translate deletes the allowed bytes several times faster
+        # than a regex can search for the others (and faster than
+        # bytearray.translate, hence the copy through a memoryview)
+        with memoryview(self._buf) as view:
+            for chunk_start in range(start, end, _CHUNK_SIZE):
+                chunk = bytes(view[chunk_start:min(end, chunk_start + _CHUNK_SIZE)])
+                invalid = chunk.translate(None, _CONTROL_FREE)
+                if invalid:
+                    self._pos = chunk_start + chunk.index(invalid[:1])
+                    raise self._error("Invalid control character in string")
+
+    def _skip_string(self):
+        # bytes.find is much faster than a regex scan over long base64
+        # payloads, so runs without a backslash are found with it; from a
+        # backslash on, _STRING_BODY checks the escapes. self._pos never
+        # points into the middle of an escape.
+        self._pos += 1
+        while True:
+            quote = self._buf.find(b'"', self._pos)
+            end = len(self._buf) if quote < 0 else quote
+            backslash = self._buf.find(b'\\', self._pos, end)
+            if backslash < 0:
+                self._check_control_free(self._pos, end)
+                self._pos = end
+                if quote >= 0:
+                    self._pos += 1
+                    return
+                self._more()
+                continue
+            self._check_control_free(self._pos, backslash)
+            self._pos = _STRING_BODY.match(self._buf, backslash).end()
+            remaining = len(self._buf) - self._pos
+            if remaining and self._buf[self._pos] == 0x22:
+                self._pos += 1
+                return
+            if remaining > 5 or (remaining and self._buf[self._pos] != 0x5c):
+                raise self._error("Invalid string")
+            # The buffer ends in the string, possibly in an escape
+            self._more()
+
+    def skip_value(self):
+        """Consume the next value without building Python objects for it."""
+        token = self.peek()
+        if token == b'"':
+            self._skip_string()
+        elif token in (b'[', b'{'):
+            closers = bytearray()  # the bracket expected to close each open one
+            while True:
+                self._pos = _SHORT_STRINGS.match(self._buf, self._pos).end()
+                match = _STRUCTURAL.search(self._buf, self._pos)
+                if match is None:
+                    # All that is left is a scalar cut off by the end of the buffer
+                    self._more()
+                    continue
+                if match.start() != self._pos:
+                    raise self._error("Invalid value")
+                char = self._buf[match.start()]
+                if char == 0x22:
+                    self._pos = match.start()
+                    self._skip_string()
+                    continue
+                if char in b'[{':
+                    closers.append(0x5d if char == 0x5b else 0x7d)
+                elif closers.pop() != char:
+                    raise self._error("Mismatched bracket")
+                self._pos = match.end()
+                if not closers:
+                    return
+        else:
+            scanned = 0  # bytes after the cursor already searched for the scalar's end
+            while True:
+                match = _SCALAR_END.search(self._buf, self._pos + scanned)
+                if match:
+                    break
+                scanned = len(self._buf) - self._pos
+                self._more()
+            if _SCALAR_VALUE.fullmatch(self._buf, self._pos, match.start()) is None:
+                raise self._error("Invalid value")
+            self._pos = match.start()
+
+    def read_value(self):
+        """Consume and decode the next value."""
+        self.peek()
+        self._keep = self._pos
+        try:
+            self.skip_value()
+            return json.loads(self._buf[self._keep:self._pos])
+        finally:
+            self._keep = None
+
+    def skip_bom(self):
+        """Skip a UTF-8 byte order mark at the cursor; json.loads allows one before bytes."""
+        while len(self._buf) - self._pos < 3 and self._fill():
+            pass
+        if self._buf[self._pos:self._pos + 3] == b'\xef\xbb\xbf':
+            self._pos += 3
+
+    def expect_end(self):
+        """Check that nothing but whitespace follows the cursor."""
+        try:
+            self.peek()
+        except ValueError:
+            return
+        raise self._error("Extra data")
+
+    def iter_object(self):
+        """Yield each key of the object at the cursor.
+
+        The caller must consume the matching value before asking for the next key.
+        """
+        self.expect(b'{')
+        if self.peek() == b'}':
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != b'"':
+                raise self._error("Expected object key")
+            key = self.read_value()
+            self.expect(b':')
+            yield key
+            token = self.peek()
+            self._pos += 1
+            if token == b'}':
+                return
+            if token != b',':
+                raise self._error("Expected ',' or '}'")
+
+    def iter_array(self):
+        """Yield once per element of the array at the cursor.
+
+        The caller must consume each element before resuming the iteration.
+        """
+        self.expect(b'[')
+        if self.peek() == b']':
+            self._pos += 1
+            return
+        while True:
+            yield
+            token = self.peek()
+            self._pos += 1
+            if token == b']':
+                return
+            if token != b',':
+                raise self._error("Expected ',' or ']'")
+
+class _MappedNotebookReader(_NotebookReader):
+    """_NotebookReader over a whole notebook mapped into memory.
+
+    The scanner searches the mapping in place, so nothing is copied into a
+    buffer and only the values read with read_value() are decoded.
+    """
+
+    def __init__(self, mapping):
+        self._buf = mapping
+        self._pos = 0
+        self._offset = 0
+        self._keep = None
+
+    def _fill(self):
+        return False
+
+def _source_text(source):
+    # nbformat stores source as a string or a list of lines
+    return source if isinstance(source, str) else ''.join(source)
+
+def _iter_cells(reader, extractor=DEFAULT_EXTRACTOR):
+    """Yield every cell of a type the extractor reads, skipping outputs and attachments.
+
+    Cells are yielded as (index, cell_type, source, metadata) tuples, or,
+    for the default extractor, which only needs the code, as their source
+    alone (see _write_cells). Metadata is only decoded when the extractor
+    uses it.
+
+    Anything a full parse would read differently from the scanner is an
+    error: a repeated cells, cell_type, source or (when read) metadata key
+    (the parser keeps the last one) and data after the notebook. Skipped
+    values are only partly checked (see _SCALAR): json.loads would also
+    reject a missing comma or colon, or a number used as a key, in an output.
+    """
+    cell_types = extractor.cell_types
+    sources_only = extractor.key is None
+    read_keys = ('cell_type', 'source') + (('metadata',) if extractor.uses_metadata else ())
+    found_cells = False
+    reader.skip_bom()
+    for key in reader.iter_object():
+        if key != 'cells':
+            reader.skip_value()
+            continue
+        if found_cells:
+            raise ValueError("Duplicate 'cells' key")
+        found_cells = True
+        for index, _ in enumerate(reader.iter_array()):
+            cell_type = None
+            source = None
+            has_source = False
+            metadata = None
+            seen = set()  # read_keys found so far; cell_type may be null
+            for cell_key in reader.iter_object():
+                if cell_key in read_keys:
+                    if cell_key in seen:
+                        raise ValueError(f"Duplicate {cell_key!r} key")
+                    seen.add(cell_key)
+                if cell_key == 'cell_type':
+                    cell_type = reader.read_value()
+                elif cell_key == 'source' and ('cell_type' not in seen or cell_type in cell_types):
+                    source = reader.read_value()
+                    has_source = True
+                elif cell_key == 'metadata' and extractor.uses_metadata:
+                    metadata = reader.read_value()
+                else:
+                    reader.skip_value()
+            if 'cell_type' not in seen:
+                raise KeyError('cell_type')
+            if cell_type in cell_types:
+                if not has_source:
+                    raise KeyError('source')
+                source = _source_text(source)
+                yield source if sources_only else (index, cell_type, source, metadata)
+    reader.expect_end()
+
+    # Verify this is a Jupyter notebook
+    if not found_cells:
+        raise ValueError("This file does not appear to be a valid Jupyter notebook.")
+
+def _import_json_backend(name):
+    """Return the loads() function of a JSON backend; raises ImportError if missing."""
+    if name == 'json':
+        return json.loads
+    if name == 'orjson':
+        import orjson
+        return orjson.loads
+    if name == 'simdjson':
+        import simdjson
+        return simdjson.loads
+    raise ValueError(f"Unknown JSON backend: {name}")
+
+def available_json_backends():
+    """Return the names of the installed JSON backends, fastest first."""
+    names = []
+    for name in JSON_BACKENDS:
+        try:
+            _import_json_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+_json_backend = None  # (name, loads), chosen on first use
+
+def set_json_backend(name=None):
+    """Select the JSON backend used for whole-notebook parsing and return its name.
+
+    Without a name, IPYNB_JSON_BACKEND is honoured if set, otherwise the
+    fastest installed backend is used.
+    """
+    global _json_backend
+    name = name or os.environ.get('IPYNB_JSON_BACKEND') or available_json_backends()[0]
+    _json_backend = (name, _import_json_backend(name))
+    return name
+
+def _loads_notebook(data):
+    if _json_backend is None:
+        set_json_backend()
+    name, loads = _json_backend
+    if name != 'json':
+        try:
+            return loads(data)
+        except Exception:
+            # Let the standard library decide, so that edge cases (lone
+            # surrogates, BOMs) and error messages match on every backend
+            pass
+    return json.loads(data)
+
+def _iter_loaded_cells(notebook, extractor=DEFAULT_EXTRACTOR):
+    """Like _iter_cells, for an already parsed notebook."""
+    # Verify this is a Jupyter notebook
+    if 'cells' not in notebook:
+        raise ValueError("This file does not appear to be a valid Jupyter notebook.")
+        
+    if extractor.key is None:
+        for cell in notebook['cells']:
+            if cell['cell_type'] == 'code':
+                yield _source_text(cell['source'])
+        return
+    cell_types = extractor.cell_types
+    uses_metadata = extractor.uses_metadata
+    for index, cell in enumerate(notebook['cells']):
+        cell_type = cell['cell_type']
+        if cell_type in cell_types:
+            yield (index, cell_type, _source_text(cell['source']),
+                   cell.get('metadata') if uses_metadata else None)
+
+def _extract_code(f, size, record=None, extractor=DEFAULT_EXTRACTOR):
+    """Extract the cells an Extractor selects from an open binary notebook file of the given size.
+
+    size is None when it isn't known up front, as for a decompressing
+    stream; the notebook is then parsed whole if it turns out to be small.
+    A large file on disk is memory-mapped when possible (see _map_notebook);
+    other large notebooks are streamed. Either way a repeated key that the
+    parser would resolve is an error rather than a different reading (see
+    _iter_cells).
+    With a record (see instrumentation), the read, parse and join times and
+    the cell count are added to it; a streamed notebook is read while it is
+    parsed, so all of that is charged to parse.
+    """
+    streamed = False
+    
+    if size is None:
+        head = f.read(FULL_PARSE_MAX_BYTES + 1)
+        lap(record, 'read')
+        if len(head) <= FULL_PARSE_MAX_BYTES:
+            cells = _iter_loaded_cells(_loads_notebook(head), extractor)
+        else:
+            streamed = True
+            cells = _iter_cells(_NotebookReader(f, prefix=head), extractor)
+    elif size <= FULL_PARSE_MAX_BYTES:
+        data = f.read()
+        lap(record, 'read')
+        cells = _iter_loaded_cells(_loads_notebook(data), extractor)
+    else:
+        mapping = _map_notebook(f, size)
+        if mapping is not None:
+            with mapping:
+                return _extract_mapped_code(mapping, record, extractor)
+        streamed = True
+        cells = _iter_cells(_NotebookReader(f), extractor)
+    lap(record, 'parse')
+    return _write_cells(cells, extractor, record, streamed)
+
+def _write_cells(cells, extractor=DEFAULT_EXTRACTOR, record=None, streamed=False):
+    """Filter, transform and write cells into the text written for a notebook.
+
+    cells are what _iter_cells yields, possibly still being read from
+    the notebook, so the filters, transforms and writer run in the same
+    pass as the scanner.
+    """
+    if extractor.key is None:
+        # The default output needs nothing but the code, so no Cells are built
+        cells = list(cells)
+        code_content = TextWriter.join(cells)
+    else:
+        cells = list(extractor.select(Cell(*cell) for cell in cells))
+        code_content = extractor.writer.write(cells)
+    if record is not None:
+        lap(record, 'parse' if streamed else 'join')
+        record['cells'] = len(cells)
+    return code_content
+
+def _map_notebook(f, size):
+    """Map a large notebook file read-only, or return None to stream it instead.
+
+    Only a file opened straight from disk and not yet read from is mapped;
+    archive members, decompressing streams and in-memory data are not.
+    """
+    if not MMAP_NOTEBOOKS or size is None or size <= FULL_PARSE_MAX_BYTES:
+        return None
+    if not isinstance(getattr(f, 'raw', f), io.FileIO) or f.tell() != 0:
+        return None
+    import mmap
+    try:
+        if os.fstat(f.fileno()).st_size != size:
+            return None
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if hasattr(mapping, 'madvise'):
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+    return mapping
+
+def _extract_mapped_code(mapping, record=None, extractor=DEFAULT_EXTRACTOR):
+    """Extract the cells an Extractor selects from a memory-mapped notebook.
+
+    The mapping is scanned like a streamed notebook; anything the scanner
+    rejects is an error, as parsing the whole file instead would take the
+    memory the mapping is there to save.
+    """
+    cells = _iter_cells(_MappedNotebookReader(mapping), extractor)
+    return _write_cells(cells, extractor, record, streamed=True)
+
+def extract_code_from_notebook(notebook_path, extractor=None):
+    """Extract only code cells from a Jupyter notebook.
+
+    With an extractor (see converter_cells.Extractor), the cells it selects
+    are extracted and written in its format instead. The notebook may be
+    compressed, or be an archive member addressed as "archive.zip::member.ipynb".
+    """
+    extractor = extractor or DEFAULT_EXTRACTOR
+    record = start_record('extract', notebook_path)
+    try:
+        archive_path, member_name = split_member_path(notebook_path)
+        compression = compression_for_path(member_name or notebook_path)
+        if member_name is not None:
+            with open_archive_member(archive_path, member_name) as (f, size):
+                code_content = _read_notebook(f, size, compression, record, extractor)[0]
+        else:
+            with open(notebook_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if compression:
+                    with open_compressed(compression=compression, fileobj=f) as stream:
+                        code_content = _extract_code(stream, None, record, extractor)
+                else:
+                    code_content = _extract_code(f, size, record, extractor)
+    except Exception as e:
+        finish_record(record, e)
+        raise Exception(f"Error processing {notebook_path}: {str(e)}")
+    finish_record(record, bytes_in=size, chars_out=len(code_content))
+    return code_content
+
+def make_temp_file(path):
+    """Create an empty, uniquely named file to be renamed over path.
+
+    Returns (temp_path, target_path). target_path is path with symlinks
+    resolved, so renaming over it replaces the file a link points to rather
+    than the link. The file is created next to it with the mode of the file
+    it will replace, or for a new file the mode open() would give it.
+    Concurrent writers of the same path each get their own file, so one
+    can't truncate or rename another's half-written one.
+    """
+    target_path = os.path.realpath(path)
+    try:
+        mode = os.stat(target_path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = None
+    while True:
+        temp_path = f"{target_path}.{os.urandom(6).hex()}.tmp"
+        try:
+            fd = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            continue
+        break
+    os.close(fd)
+    if mode is not None:
+        try:
+            os.chmod(temp_path, mode)
+        except OSError:
+            os.remove(temp_path)
+            raise
+    return temp_path, target_path
+
+def save_as_text(code_content, output_path, compression_level=None):
+    """Save the extracted code to a text file, compressed if output_path has a codec suffix.
+
+    The text is written to a temporary file that is then renamed over
+    output_path, so readers never see a partly written output.
+    """
+    record = start_record('save', output_path)
+    temp_path = None
+    try:
+        temp_path, target_path = make_temp_file(output_path)
+        compression = compression_for_path(output_path)
+        if compression:
+            # Named after output_path, which gzip records in its header
+            with open(temp_path, 'wb') as raw:
+                with open_compressed(output_path, 'wb', compression, compression_level, raw) as f:
+                    f.write(code_content.encode('utf-8'))
+        else:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(code_content)
+        os.replace(temp_path, target_path)
+    except Exception as e:
+        finish_record(record, e)
+        if temp_path is not None:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        raise Exception(f"Error saving to {output_path}: {str(e)}")
+    if record is not None:
+        finish_record(record, bytes_out=os.path.getsize(output_path))
+    return True
+
+def compression_for_path(path):
+    """Return the codec named by a path's suffix (e.g. 'gzip' for .gz), or None."""
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+def strip_compression_suffix(path):
+    """Return path without a trailing codec suffix."""
+    return os.path.splitext(path)[0] if compression_for_path(path) else path
+
+def is_notebook_path(path):
+    """Check for a .ipynb name, optionally followed by a codec suffix."""
+    return strip_compression_suffix(path).lower().endswith(NOTEBOOK_SUFFIX)
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd compression needs the zstandard package (pip install zstandard)") from None
+    return zstandard
+
+def open_compressed(path=None, mode='rb', compression=None, level=None, fileobj=None):
+    """Open a binary stream that decompresses as it reads or compresses as it writes.
+
+    The codec is compression (one of COMPRESSION_CODECS) or else the one
+    named by path's suffix; plain files are opened as they are. Instead of
+    a path, an open binary fileobj can be given, e.g. io.BytesIO of the
+    compressed bytes; it is not closed with the stream. With both, the
+    stream goes through fileobj and path only names it. level is the
+    codec's compression level, DEFAULT_COMPRESSION_LEVELS if None.
+    """
+    if compression is None and path is not None:
+        compression = compression_for_path(path)
+    if compression is None:
+        return fileobj if fileobj is not None else open(path, mode)
+    if compression not in COMPRESSION_CODECS:
+        raise ValueError(f"Unknown compression {compression!r}; expected one of "
+                         f"{', '.join(COMPRESSION_CODECS)}")
+    
+    writing = 'r' not in mode
+    if level is None:
+        level = DEFAULT_COMPRESSION_LEVELS[compression]
+    if compression == 'gzip':
+        import gzip
+        return gzip.GzipFile(path, mode, compresslevel=level, fileobj=fileobj)
+    if compression == 'bz2':
+        import bz2
+        return bz2.BZ2File(fileobj if fileobj is not None else path, mode, compresslevel=level)
+    if compression == 'xz':
+        import lzma
+        return lzma.LZMAFile(fileobj if fileobj is not None else path, mode,
+                             preset=level if writing else None)
+    
+    zstandard = _import_zstandard()
+    raw = fileobj if fileobj is not None else open(path, mode)
+    if writing:
+        return zstandard.ZstdCompressor(level=level).stream_writer(raw, closefd=fileobj is None)
+    return zstandard.ZstdDecompressor().stream_reader(raw, closefd=fileobj is None)
+
+def new_hash():
+    """Return the hash used for notebook and merge input contents (BLAKE2b, 128 bits)."""
+    import hashlib
+    return hashlib.blake2b(digest_size=16)
+
+class _HashingReader:
+    """Binary file wrapper that hashes everything read through it."""
+
+    def __init__(self, f):
+        self._file = f
+        self.hash = new_hash()
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self.hash.update(data)
+        return data
+
+    def hexdigest(self):
+        """Hash the rest of the file and return the digest of all of it."""
+        while self.read(_CHUNK_SIZE):
+            pass
+        return self.hash.hexdigest()
+
+def _output_matches(entry, output_path):
+    """Check that an output file is still the one recorded in a cache entry."""
+    try:
+        st = os.stat(output_path)
+    except OSError:
+        return False
+    return st.st_size == entry['output_size'] and st.st_mtime_ns == entry['output_mtime_ns']
+
+def _read_notebook(f, size, compression=None, record=None, extractor=DEFAULT_EXTRACTOR):
+    """Extract code from an open notebook, returning (code_content, content_hash).
+
+    With compression, f holds compressed bytes and is decompressed as it is
+    read; content_hash is always the hash of the bytes in f. record and
+    extractor are passed on to _extract_code.
+    """
+    mapping = None if compression else _map_notebook(f, size)
+    if mapping is not None:
+        with mapping:
+            content_hash = new_hash()
+            content_hash.update(mapping)
+            lap(record, 'read')
+            return _extract_mapped_code(mapping, record, extractor), content_hash.hexdigest()
+    reader = _HashingReader(f)
+    if compression:
+        with open_compressed(compression=compression, fileobj=reader) as stream:
+            code_content = _extract_code(stream, None, record, extractor)
+    else:
+        code_content = _extract_code(reader, size, record, extractor)
+    return code_content, reader.hexdigest()
+
+def parse_notebook(notebook_path, data=None, extractor=None):
+    """Extract code from a notebook, returning (code_content, content_hash).
+
+    The notebook is parsed from data if given (its raw bytes), otherwise it
+    is read from notebook_path. Either is decompressed if notebook_path has
+    a codec suffix. extractor is as for extract_code_from_notebook.
+    """
+    extractor = extractor or DEFAULT_EXTRACTOR
+    compression = compression_for_path(notebook_path)
+    record = start_record('extract', notebook_path)
+    try:
+        if data is not None:
+            size = len(data)
+            result = _read_notebook(io.BytesIO(data), size, compression, record, extractor)
+        else:
+            with open(notebook_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                result = _read_notebook(f, size, compression, record, extractor)
+    except Exception as e:
+        finish_record(record, e)
+        raise Exception(f"Error processing {notebook_path}: {str(e)}")
+    finish_record(record, bytes_in=size, chars_out=len(result[0]))
+    return result
+
+class DuplicateOutputs:
+    """Remembers the first output written for each extracted code hash in a run.
+
+    Passed to write_converted, it turns notebooks whose code is identical to
+    an earlier one's (forks, copies) into no output at all ('skip') or a
+    one-line "# Same code as <first output>" file ('reference'). The hash is
+    the BLAKE2b digest write_converted computes anyway, so detection costs
+    nothing extra. Safe to share between writer threads.
+    """
+
+    def __init__(self, mode='reference'):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode {mode!r}; expected one of {', '.join(DEDUP_MODES)}")
+        self.mode = mode
+        self.first_outputs = {}
+        self.duplicate_count = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def remember(self, code_hash, output_path):
+        """Record an existing output, e.g. one from an earlier run, as the first with its code."""
+        self.first_outputs.setdefault(code_hash, os.path.abspath(output_path))
+
+    def claim(self, code_hash, output_path, code_size):
+        """Return the first output with this code, or None if output_path should be written.
+
+        code_size is the size of the code in bytes; what dedup saves on it
+        is added to bytes_saved. In 'reference' mode code no longer than
+        the reference itself is written out as usual.
+        """
+        output_path = os.path.abspath(output_path)
+        with self._lock:
+            first_output = self.first_outputs.setdefault(code_hash, output_path)
+            if first_output == output_path:
+                return None
+            saved = code_size
+            if self.mode == 'reference':
+                saved -= len(self.reference(first_output).encode('utf-8'))
+                if saved <= 0:
+                    return None
+            self.duplicate_count += 1
+            self.bytes_saved += saved
+        return first_output
+
+    def reference(self, first_output):
+        return f"# Same code as {first_output}\n"
+
+def write_converted(code_content, content_hash, notebook_stat, output_path, previous=None,
+                    dedup=None, compression_level=None):
+    """Write extracted code to output_path and return (entry, written).
+
+    entry is the cache entry describing the conversion, built from the
+    notebook's stat result and content hash. When previous is an earlier
+    entry for the same output and the extracted code has not changed, the
+    existing output is left untouched and written is False.
+
+    With dedup (a DuplicateOutputs), code already written for another
+    notebook is skipped or replaced by a reference to it; the entry then
+    has a 'duplicate_of' key naming the first output.
+
+    An output_path with a codec suffix (e.g. .txt.gz) is written compressed
+    at compression_level; entry['code_size'] is the uncompressed size.
+    """
+    encoded = code_content.encode('utf-8')
+    code_hash = new_hash()
+    code_hash.update(encoded)
+    code_hash = code_hash.hexdigest()
+    
+    duplicate_of = None
+    if dedup is not None:
+        duplicate_of = dedup.claim(code_hash, output_path, len(encoded))
+    entry = {
+        'output': os.path.abspath(output_path),
+        'mtime_ns': notebook_stat.st_mtime_ns,
+        'size': notebook_stat.st_size,
+        'content_hash': content_hash,
+        'code_hash': code_hash,
+        'code_size': len(encoded),
+    }
+    if duplicate_of is not None:
+        entry['duplicate_of'] = duplicate_of
+        if dedup.mode == 'skip':
+            entry['output_size'] = entry['output_mtime_ns'] = None
+            return entry, False
+        code_content = dedup.reference(duplicate_of)
+    
+    written = not (previous is not None
+                   and previous['code_hash'] == code_hash
+                   and previous.get('duplicate_of') == duplicate_of
+                   and _output_matches(previous, output_path))
+    if written:
+        save_as_text(code_content, output_path, compression_level)
+    
+    output_st = os.stat(output_path)
+    entry['output_size'] = output_st.st_size
+    entry['output_mtime_ns'] = output_st.st_mtime_ns
+    return entry, written
+
+def convert_notebook(notebook_path, output_path, previous=None, dedup=None,
+                     compression_level=None, extractor=None):
+    """Convert one notebook to a text file.
+
+    Returns (entry, written): the cache entry describing the conversion and
+    whether the output was written. When previous is an earlier entry for the
+    same output and the extracted code has not changed, the existing output is
+    left untouched. dedup and compression_level are passed on to
+    write_converted; a compressed notebook (.ipynb.gz etc.) is decompressed
+    as it is read. extractor is as for extract_code_from_notebook.
+    """
+    record = start_record('extract', notebook_path)
+    try:
+        with open(notebook_path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            code_content, content_hash = _read_notebook(f, st.st_size,
+                                                        compression_for_path(notebook_path), record,
+                                                        extractor or DEFAULT_EXTRACTOR)
+    except Exception as e:
+        finish_record(record, e)
+        raise Exception(f"Error processing {notebook_path}: {str(e)}")
+    finish_record(record, bytes_in=st.st_size, chars_out=len(code_content))
+    
+    return write_converted(code_content, content_hash, st, output_path, previous, dedup,
+                           compression_level)
+
+class ConversionCache:
+    """On-disk manifest of earlier conversions, used to skip unchanged notebooks.
+
+    Entries are keyed by absolute notebook path. On save, entries whose
+    notebook no longer exists are dropped and the least recently used ones are
+    evicted so the manifest never holds more than max_entries. Entries
+    record the key of the extractor (see converter_cells.Extractor) they
+    were converted with, and only count as up to date for the same one.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, max_entries=CACHE_MAX_ENTRIES, extractor=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.extractor_key = extractor.key if extractor is not None else None
+        self.entries = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.entries = data['entries']
+        except (OSError, ValueError, KeyError, AttributeError):
+            # Missing or unreadable manifest: start from scratch
+            pass
+
+    def lookup(self, notebook_path, output_path):
+        """Return (up_to_date, previous_entry) for a notebook and its output.
+
+        Only stat() is used, so up-to-date notebooks are never opened.
+        """
+        entry = self.entries.get(os.path.abspath(notebook_path))
+        if entry is None or entry['output'] != os.path.abspath(output_path):
+            return False, None
+        try:
+            st = os.stat(notebook_path)
+        except OSError:
+            return False, None
+        entry['last_used'] = time.time()
+        # A duplicate's output depends on which notebook came first, so it
+        # is always reconsidered
+        up_to_date = (st.st_mtime_ns == entry['mtime_ns']
+                      and st.st_size == entry['size']
+                      and entry.get('extractor') == self.extractor_key
+                      and 'duplicate_of' not in entry
+                      and _output_matches(entry, output_path))
+        return up_to_date, entry
+
+    def current_outputs(self):
+        """Yield (code_hash, output_path) for outputs that are up to date and not duplicates."""
+        for notebook_path, entry in self.entries.items():
+            if 'duplicate_of' in entry:
+                continue
+            try:
+                st = os.stat(notebook_path)
+            except OSError:
+                continue
+            if (st.st_mtime_ns == entry['mtime_ns'] and st.st_size == entry['size']
+                    and entry.get('extractor') == self.extractor_key
+                    and _output_matches(entry, entry['output'])):
+                yield entry['code_hash'], entry['output']
+
+    def record(self, notebook_path, entry):
+        entry['last_used'] = time.time()
+        if self.extractor_key is not None:
+            entry['extractor'] = self.extractor_key
+        self.entries[os.path.abspath(notebook_path)] = entry
+
+    def forget(self, notebook_path):
+        """Drop and return the entry for a notebook, or None if there is none."""
+        return self.entries.pop(os.path.abspath(notebook_path), None)
+
+    def save(self):
+        """Prune and evict entries, then write the manifest atomically."""
+        self.entries = {path: entry for path, entry in self.entries.items()
+                        if os.path.exists(path)}
+        if len(self.entries) > self.max_entries:
+            recent = sorted(self.entries.items(),
+                            key=lambda item: item[1].get('last_used', 0),
+                            reverse=True)
+            self.entries = dict(recent[:self.max_entries])
+        
+        temp_path, target_path = make_temp_file(self.path)
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'entries': self.entries}, f)
+            os.replace(temp_path, target_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+def text_output_path(notebook_path, output_dir=None, suffix='.txt'):
+    """Return the .txt (or suffix) path for a notebook, next to it unless output_dir is given."""
+    base_name = os.path.splitext(os.path.basename(strip_compression_suffix(notebook_path)))[0]
+    if output_dir is None:
+        output_dir = os.path.dirname(notebook_path)
+    return os.path.join(output_dir, f"{base_name}{suffix}")
+
+class OutputClaims:
+    """Remembers which notebook each output path of a run belongs to.
+
+    Compression suffixes are dropped from output names, so x.ipynb and
+    x.ipynb.gz would both be converted into x.txt; the caller refuses
+    whichever notebook claims the output second.
+    """
+
+    def __init__(self):
+        self._owners = {}
+
+    def _key(self, output_path):
+        return os.path.normcase(os.path.abspath(output_path))
+
+    def claim(self, notebook_path, output_path):
+        """Return the other notebook output_path belongs to, or None if notebook_path may write it."""
+        owner = self._owners.setdefault(self._key(output_path), notebook_path)
+        if os.path.abspath(owner) != os.path.abspath(notebook_path):
+            return owner
+        return None
+
+    def release(self, notebook_path, output_path):
+        """Free output_path if it belongs to notebook_path, e.g. once the notebook is deleted."""
+        key = self._key(output_path)
+        owner = self._owners.get(key)
+        if owner is not None and os.path.abspath(owner) == os.path.abspath(notebook_path):
+            del self._owners[key]
+
+def _path_matches(relative_path, patterns):
+    return any(fnmatch.fnmatchcase(relative_path, pattern) for pattern in patterns)
+
+def is_tree_directory(relative_path, exclude=None):
+    """Check whether iter_notebook_tree descends into the directory at relative_path.
+
+    relative_path uses '/' separators; the directory is skipped if it or
+    any directory above it is .ipynb_checkpoints or matches exclude.
+    """
+    parts = relative_path.split('/')
+    exclude = exclude or []
+    return (not SKIP_DIRECTORIES.intersection(parts)
+            and not any(_path_matches('/'.join(parts[:depth]), exclude)
+                        for depth in range(1, len(parts) + 1)))
+
+def is_tree_notebook(relative_path, include=None, exclude=None):
+    """Check whether iter_notebook_tree would yield the file at relative_path."""
+    directory, _, name = relative_path.rpartition('/')
+    return (strip_compression_suffix(name).endswith(NOTEBOOK_SUFFIX)
+            and (not directory or is_tree_directory(directory, exclude))
+            and _path_matches(relative_path, include or ['*'])
+            and not _path_matches(relative_path, exclude or []))
+
+def iter_notebook_tree(root, include=None, exclude=None):
+    """Yield (path, relative_path) for every notebook under root as it is found.
+
+    Directories are walked with os.scandir and results are streamed, so
+    callers can start converting before the walk finishes. Relative paths use
+    '/' separators; include and exclude are fnmatch patterns matched against
+    them ('*' also matches '/'). A directory matching an exclude pattern is
+    not descended into, and .ipynb_checkpoints directories are always skipped.
+    """
+    include = include or ['*']
+    exclude = exclude or []
+    pending = [(root, '')]
+    while pending:
+        directory, prefix = pending.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            # Unreadable or vanished directory
+            continue
+        with entries:
+            for entry in entries:
+                relative_path = prefix + entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    if entry.name not in SKIP_DIRECTORIES and not _path_matches(relative_path, exclude):
+                        pending.append((entry.path, relative_path + '/'))
+                elif (strip_compression_suffix(entry.name).endswith(NOTEBOOK_SUFFIX)
+                      and _path_matches(relative_path, include)
+                      and not _path_matches(relative_path, exclude)):
+                    yield entry.path, relative_path
+
+def mirrored_output_path(relative_path, output_root, suffix='.txt'):
+    """Return the .txt (or suffix) path for a notebook at relative_path, mirrored under output_root."""
+    relative_path = os.path.splitext(strip_compression_suffix(relative_path))[0]
+    return os.path.join(output_root, *(relative_path + suffix).split('/'))
+
+def is_archive_path(path):
+    """Check for a zip or (possibly compressed) tar name."""
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+def archive_stem(archive_path):
+    """Return an archive's file name without its archive suffix."""
+    name = os.path.basename(archive_path)
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+def member_path(archive_path, member_name):
+    """Return the "<archive>::<member>" path of an archive member."""
+    return f"{archive_path}{ARCHIVE_MEMBER_SEPARATOR}{member_name}"
+
+def split_member_path(path):
+    """Split an "<archive>::<member>" path; the member name is None for other paths."""
+    archive_path, separator, member_name = path.partition(ARCHIVE_MEMBER_SEPARATOR)
+    if separator and is_archive_path(archive_path):
+        return archive_path, member_name
+    return path, None
+
+def _safe_member_name(name):
+    """Return a member name normalised to a relative '/' path, or None if it escapes."""
+    name = posixpath.normpath(name.replace('\\', '/'))
+    if name.startswith(('/', '../')) or name in ('.', '..'):
+        return None
+    return name
+
+def iter_archive(archive_path):
+    """Yield (member_name, size, fileobj) for every regular file in an archive.
+
+    Members come in the order they are stored, and the archive is read in a
+    single sequential pass: tars (compressed or not) are read front to back,
+    zips in offset order. Each fileobj is only valid until the next member
+    is requested. Members whose names are absolute or climb out with '..'
+    are skipped, so paths built from member names stay inside an output
+    directory.
+    """
+    import tarfile
+    import zipfile
+    
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            infos = sorted((info for info in archive.infolist() if not info.is_dir()),
+                           key=lambda info: info.header_offset)
+            for info in infos:
+                name = _safe_member_name(info.filename)
+                if name is not None:
+                    with archive.open(info) as f:
+                        yield name, info.file_size, f
+        return
+    
+    with tarfile.open(archive_path, 'r:*') as archive:
+        for member in archive:
+            name = _safe_member_name(member.name)
+            if member.isfile() and name is not None:
+                yield name, member.size, archive.extractfile(member)
+
+class _ArchiveReader:
+    """An open archive whose members are looked up by name.
+
+    Zip members are found through the central directory. A tar is read on
+    from the last member found only as far as the next one asked for, and
+    members already passed are reopened at their recorded offsets, so
+    taking a tar's members in stored order is one sequential pass over it.
+    """
+
+    def __init__(self, archive_path):
+        import tarfile
+        import zipfile
+        
+        st = os.stat(archive_path)
+        self.archive_path = archive_path
+        self.identity = (archive_path, st.st_size, st.st_mtime_ns)
+        self._zip = None
+        self._tar = None
+        self._members = {}
+        if archive_path.lower().endswith('.zip'):
+            self._zip = zipfile.ZipFile(archive_path)
+            for info in self._zip.infolist():
+                name = _safe_member_name(info.filename)
+                if name is not None and not info.is_dir():
+                    self._members.setdefault(name, info)
+        else:
+            self._tar = tarfile.open(archive_path, 'r:*')
+
+    def open(self, member_name):
+        """Return (fileobj, size) for a member."""
+        wanted = _safe_member_name(member_name)
+        member = self._members.get(wanted)
+        if self._zip is not None:
+            if member is not None:
+                return self._zip.open(member), member.file_size
+        else:
+            while member is None and (member := self._tar.next()) is not None:
+                name = _safe_member_name(member.name)
+                if member.isfile() and name is not None:
+                    self._members.setdefault(name, member)
+                if name != wanted or not member.isfile():
+                    member = None
+            if member is not None:
+                return self._tar.extractfile(member), member.size
+        raise KeyError(f"No member {member_name!r} in {self.archive_path}")
+
+    def close(self):
+        (self._zip or self._tar).close()
+
+# The last archive open_archive_member read from, per thread
+_archive_readers = threading.local()
+
+@contextlib.contextmanager
+def open_archive_member(archive_path, member_name):
+    """Open one member by name, as a context manager giving (fileobj, size).
+
+    The archive is kept open for the next call on the same thread, so
+    reading many members of one archive doesn't re-read its directory, and
+    reading a tar's members in order doesn't re-scan it.
+    """
+    st = os.stat(archive_path)
+    reader = getattr(_archive_readers, 'reader', None)
+    if reader is None or reader.identity != (archive_path, st.st_size, st.st_mtime_ns):
+        if reader is not None:
+            reader.close()
+        reader = _archive_readers.reader = _ArchiveReader(archive_path)
+    f, size = reader.open(member_name)
+    with f:
+        yield f, size
+
+def iter_archive_notebooks(archive_path, include=None, exclude=None):
+    """Yield (member_name, size, fileobj) for the notebooks in an archive, in storage order.
+
+    Members are filtered like iter_notebook_tree filters files: include and
+    exclude are fnmatch patterns matched against member names, and anything
+    under .ipynb_checkpoints is skipped. Compressed members (.ipynb.gz etc.)
+    count as notebooks.
+    """
+    include = include or ['*']
+    exclude = exclude or []
+    for name, size, f in iter_archive(archive_path):
+        if (strip_compression_suffix(name).endswith(NOTEBOOK_SUFFIX)
+                and not SKIP_DIRECTORIES.intersection(name.split('/')[:-1])
+                and _path_matches(name, include)
+                and not _path_matches(name, exclude)):
+            yield name, size, f
+
+def parse_archive_member(notebook_path, f, size, extractor=None):
+    """Extract code from an open archive member, returning (code_content, content_hash).
+
+    notebook_path is the member's "<archive>::<member>" path, used for its
+    compression suffix and in error messages. extractor is as for
+    extract_code_from_notebook.
+    """
+    record = start_record('extract', notebook_path)
+    try:
+        result = _read_notebook(f, size, compression_for_path(notebook_path), record,
+                                extractor or DEFAULT_EXTRACTOR)
+    except Exception as e:
+        finish_record(record, e)
+        raise Exception(f"Error processing {notebook_path}: {str(e)}")
+    finish_record(record, bytes_in=size, chars_out=len(result[0]))
+    return result
+
+def archive_output_name(archive_path, member_name, suffix='.txt'):
+    """Return the '/'-separated output name for a notebook member: <archive stem>/<member>.txt.
+
+    suffix replaces .txt.
+    """
+    stem = os.path.splitext(strip_compression_suffix(member_name))[0]
+    return f"{archive_stem(archive_path)}/{stem}{suffix}"
+
+class OutputArchive:
+    """A .zip or .tar (optionally .gz/.bz2/.xz) file that outputs are added to as members."""
+
+    def __init__(self, path, compression_level=None):
+        import tarfile
+        import zipfile
+        
+        lower = path.lower()
+        self.path = path
+        self.names = set()
+        self._tar = None
+        self._zip = None
+        if lower.endswith('.zip'):
+            self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED,
+                                        compresslevel=compression_level)
+            return
+        if not is_archive_path(path):
+            raise ValueError(f"Output archive {path} must end in one of {', '.join(ARCHIVE_SUFFIXES)}")
+        codec = compression_for_path(path) or {'.tgz': 'gzip', '.tbz2': 'bz2', '.txz': 'xz'}.get(
+            os.path.splitext(lower)[1])
+        mode = {None: 'w', 'gzip': 'w:gz', 'bz2': 'w:bz2', 'xz': 'w:xz'}[codec]
+        options = {}
+        if codec is not None:
+            level = compression_level if compression_level is not None else DEFAULT_COMPRESSION_LEVELS[codec]
+            options = {'preset': level} if codec == 'xz' else {'compresslevel': level}
+        self._tar = tarfile.open(path, mode, **options)
+        self._tarfile = tarfile
+
+    def add(self, name, text):
+        """Add text as a UTF-8 member called name, which must not be in the archive yet."""
+        if name in self.names:
+            raise ValueError(f"{name} is already in {self.path}")
+        self.names.add(name)
+        data = text.encode('utf-8')
+        if self._zip is not None:
+            self._zip.writestr(name, data)
+            return
+        info = self._tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        (self._zip or self._tar).close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# The characters glob.has_magic looks for, so glob is only imported for a pattern
+_GLOB_MAGIC = re.compile(r'[*?[]')
+
+def find_notebooks(inputs, output_dir=None, include=None, exclude=None, suffix='.txt'):
+    """Yield (notebook_path, output_path) pairs from files, directories and glob patterns.
+
+    Directories are converted as trees (see iter_notebook_tree) with their
+    layout mirrored under output_dir, so same-named notebooks in different
+    folders don't collide. Files and glob matches go straight into output_dir.
+    Without output_dir, every output is written next to its notebook. Output
+    paths end in suffix.
+    """
+    for item in inputs:
+        if os.path.isdir(item):
+            for notebook_path, relative_path in iter_notebook_tree(item, include, exclude):
+                if output_dir is None:
+                    yield notebook_path, text_output_path(notebook_path, suffix=suffix)
+                else:
+                    yield notebook_path, mirrored_output_path(relative_path, output_dir, suffix)
+        elif _GLOB_MAGIC.search(item):
+            import glob
+            for notebook_path in sorted(glob.glob(item, recursive=True)):
+                yield notebook_path, text_output_path(notebook_path, output_dir, suffix)
+        else:
+            yield item, text_output_path(item, output_dir, suffix)
\ No newline at end of file
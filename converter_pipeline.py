@@ -0,0 +1,119 @@
+"""
+Asynchronous conversion pipeline
+Converts notebooks through overlapping read, parse and write stages, so that
+on high-latency storage (NFS, SMB mounts) the I/O waits of many files overlap
+instead of leaving the CPU idle between them.
+"""
+
+import asyncio
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from converter_core import FULL_PARSE_MAX_BYTES, parse_notebook, write_converted
+
+# Tasks are pulled from the (possibly lazily discovered) task iterable in
+# batches, on an I/O thread, so a slow directory walk never blocks the loop.
+TASK_BATCH_SIZE = 64
+
+def _read_notebook_file(notebook_path):
+    """Stat a notebook and read it if it is small enough to be parsed whole.
+
+    Larger notebooks are left on disk (data is None) and streamed by the parse
+    stage, so the queues never hold more than FULL_PARSE_MAX_BYTES per item.
+    """
+    with open(notebook_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        data = f.read() if st.st_size <= FULL_PARSE_MAX_BYTES else None
+    return st, data
+
+def _next_batch(iterator):
+    return list(itertools.islice(iterator, TASK_BATCH_SIZE))
+
+async def convert_notebooks_async(tasks, on_result, io_concurrency=16, parse_executor=None,
+                                  parse_workers=None, queue_depth=64, dedup=None,
+                                  compression_level=None, extractor=None):
+    """Convert (notebook_path, output_path, previous) tasks through a three-stage pipeline.
+
+    Reads and writes run on a pool of io_concurrency threads, which caps the
+    I/O in flight. Parsing runs on parse_executor (the loop's default
+    executor if None), e.g. a ProcessPoolExecutor, with parse_workers
+    concurrent jobs. The stages are joined by queues of queue_depth items,
+    which bounds memory. previous is the cache entry passed on to
+    write_converted, as are dedup (a DuplicateOutputs) and compression_level;
+    since writes happen in this process, one dedup instance sees every
+    notebook. Compressed notebooks are read as they are and decompressed by
+    the parse stage, which extracts what extractor (see parse_notebook)
+    selects.
+
+    on_result(notebook_path, output_path, entry, written, error) is called on
+    the event loop thread once per task, with error set to a message if the
+    conversion failed.
+    """
+    loop = asyncio.get_running_loop()
+    parse_workers = parse_workers or os.cpu_count() or 1
+    task_queue = asyncio.Queue(queue_depth)
+    read_queue = asyncio.Queue(queue_depth)
+    parsed_queue = asyncio.Queue(queue_depth)
+
+    with ThreadPoolExecutor(io_concurrency) as io_executor:
+        async def feed():
+            iterator = iter(tasks)
+            while True:
+                batch = await loop.run_in_executor(io_executor, _next_batch, iterator)
+                if not batch:
+                    break
+                for task in batch:
+                    await task_queue.put(task)
+
+        async def read():
+            while (task := await task_queue.get()) is not None:
+                notebook_path, output_path, previous = task
+                try:
+                    st, data = await loop.run_in_executor(io_executor, _read_notebook_file, notebook_path)
+                except Exception as e:
+                    on_result(notebook_path, output_path, None, False,
+                              f"Error processing {notebook_path}: {str(e)}")
+                    continue
+                await read_queue.put((task, st, data))
+
+        async def parse():
+            while (item := await read_queue.get()) is not None:
+                (notebook_path, output_path, previous), st, data = item
+                try:
+                    code_content, content_hash = await loop.run_in_executor(
+                        parse_executor, parse_notebook, notebook_path, data, extractor)
+                except Exception as e:
+                    on_result(notebook_path, output_path, None, False, str(e))
+                    continue
+                await parsed_queue.put((notebook_path, output_path, previous, st,
+                                        code_content, content_hash))
+
+        async def write():
+            while (item := await parsed_queue.get()) is not None:
+                notebook_path, output_path, previous, st, code_content, content_hash = item
+                try:
+                    entry, written = await loop.run_in_executor(
+                        io_executor, write_converted, code_content, content_hash, st,
+                        output_path, previous, dedup, compression_level)
+                except Exception as e:
+                    on_result(notebook_path, output_path, None, False, str(e))
+                    continue
+                on_result(notebook_path, output_path, entry, written, None)
+
+        async def run_stage(worker, count, queue, upstream):
+            # Start the workers, wait for the upstream stage to finish, then
+            # send one sentinel per worker and wait for them to drain.
+            workers = [asyncio.ensure_future(worker()) for _ in range(count)]
+            await upstream
+            for _ in range(count):
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        readers = run_stage(read, io_concurrency, task_queue, feed())
+        parsers = run_stage(parse, parse_workers, read_queue, readers)
+        await run_stage(write, io_concurrency, parsed_queue, parsers)
+
+def convert_notebooks_pipelined(tasks, on_result, **options):
+    """Run convert_notebooks_async to completion; see it for the arguments."""
+    asyncio.run(convert_notebooks_async(tasks, on_result, **options))
@@ -0,0 +1,356 @@
+"""
+Watch mode for the notebook converter
+Reports notebooks that are saved, created, moved or deleted under a set of
+directories, in debounced batches, so the command-line tool can reconvert
+just those. Changes come from inotify (through ctypes) on Linux and from
+periodic os.scandir rescans everywhere else.
+"""
+
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from converter_core import (
+    is_tree_directory,
+    is_tree_notebook,
+    mirrored_output_path,
+    text_output_path,
+)
+
+# A notebook is reported once it has had no event for DEBOUNCE_SECONDS, so the
+# writes of one save (or an autosave right before a manual save) convert it
+# once, but never later than MAX_DELAY_SECONDS after its first event even if
+# it keeps changing.
+DEBOUNCE_SECONDS = 0.2
+MAX_DELAY_SECONDS = 2.0
+
+# How often the polling fallback rescans the watched trees
+POLL_INTERVAL_SECONDS = 1.0
+
+# inotify event bits (<sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+# A notebook is only looked at once its writer has closed it or it has been
+# renamed into place (how Jupyter saves), never while it is half written
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+class _Inotify:
+    """Minimal inotify binding: directory watches and raw event reads."""
+
+    def __init__(self, libc):
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise self._os_error()
+        self.directories = {}  # watch descriptor -> directory path
+
+    @classmethod
+    def open(cls):
+        """Return an _Inotify, or None where inotify isn't available."""
+        if not sys.platform.startswith('linux'):
+            return None
+        import ctypes
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            return cls(libc)
+        except (OSError, AttributeError):
+            return None
+
+    def _os_error(self, path=None):
+        import ctypes
+        code = ctypes.get_errno()
+        return OSError(code, os.strerror(code), path)
+
+    def add(self, directory):
+        """Watch a directory. Raises OSError, ENOSPC once the user's watch limit is reached."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise self._os_error(directory)
+        self.directories[wd] = directory
+
+    def remove_tree(self, directory):
+        """Stop watching a directory and everything under it, e.g. after it moved away."""
+        prefix = directory + os.sep
+        for wd, path in list(self.directories.items()):
+            if path == directory or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self.fd, wd)
+                del self.directories[wd]
+
+    def read(self, timeout):
+        """Return the (path, mask) events that arrive within timeout seconds.
+
+        path is the file or directory an event is about; it is None for
+        IN_Q_OVERFLOW.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            directory = self.directories.get(wd)
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+            elif mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+            elif directory is not None:
+                events.append((os.path.join(directory, name) if name else directory, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class NotebookWatcher:
+    """Watches the notebooks find_notebooks(inputs, output_dir, include, exclude) yields.
+
+    inputs are directories, watched recursively and filtered like
+    iter_notebook_tree, and notebook files. wait() returns lists of
+    (notebook_path, output_path) for notebooks that were saved, created or
+    moved in, and for ones that were deleted or moved away. inotify is used
+    on Linux unless poll is set (it misses changes made by other machines
+    on network filesystems), or until it runs out of watches; otherwise the
+    inputs are rescanned every poll_interval seconds and notebooks compared
+    by size and modification time. Output paths end in suffix, as for
+    find_notebooks.
+    """
+
+    def __init__(self, inputs, output_dir=None, include=None, exclude=None,
+                 debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS,
+                 poll=False, poll_interval=POLL_INTERVAL_SECONDS, suffix='.txt'):
+        self.output_dir = output_dir
+        self.suffix = suffix
+        self.include = include
+        self.exclude = exclude
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._trees = []  # directory inputs
+        self._files = {}  # notebook file inputs -> output path
+        for item in inputs:
+            if os.path.isdir(item):
+                self._trees.append(os.path.normpath(item))
+            else:
+                path = os.path.join(os.path.dirname(item) or os.curdir, os.path.basename(item))
+                self._files[path] = text_output_path(item, output_dir, suffix)
+        self._pending = {}  # notebook path -> (first event, last event) times
+        self._inotify = None if poll else _Inotify.open()
+        self._next_poll = time.monotonic() + poll_interval
+        try:
+            self._known = self._scan(watch=self._inotify is not None)
+        except OSError:
+            self._stop_inotify()
+            self._known = self._scan()
+
+    @property
+    def mode(self):
+        """'inotify' or 'poll'."""
+        return 'poll' if self._inotify is None else 'inotify'
+
+    def _tree_relative_path(self, path):
+        for root in self._trees:
+            prefix = root if root.endswith(os.sep) else root + os.sep
+            if path.startswith(prefix):
+                return path[len(prefix):].replace(os.sep, '/')
+        return None
+
+    def _is_watched_directory(self, path):
+        if path in self._trees:
+            return True
+        relative_path = self._tree_relative_path(path)
+        return relative_path is not None and is_tree_directory(relative_path, self.exclude)
+
+    def output_path(self, notebook_path):
+        """Return the output path for a watched notebook, or None if it isn't one."""
+        if notebook_path in self._files:
+            return self._files[notebook_path]
+        relative_path = self._tree_relative_path(notebook_path)
+        if relative_path is None or not is_tree_notebook(relative_path, self.include, self.exclude):
+            return None
+        if self.output_dir is None:
+            return text_output_path(notebook_path, suffix=self.suffix)
+        return mirrored_output_path(relative_path, self.output_dir, self.suffix)
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _scan(self, directories=None, watch=False):
+        """Return {notebook path: (size, mtime_ns)} for the watched notebooks.
+
+        With directories, only the trees under them are walked. With watch,
+        every directory walked is added to inotify (OSError with ENOSPC if
+        the watch limit is reached).
+        """
+        notebooks = {}
+        if directories is None:
+            directories = list(self._trees)
+            for path in self._files:
+                stat = self._stat(path)
+                if stat is not None:
+                    notebooks[path] = stat
+            if watch:
+                for directory in {os.path.dirname(path) for path in self._files}:
+                    self._add_watch(directory)
+        pending = list(directories)
+        while pending:
+            directory = pending.pop()
+            if watch and not self._add_watch(directory):
+                continue
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                # Unreadable or vanished directory
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if is_dir:
+                        if self._is_watched_directory(entry.path):
+                            pending.append(entry.path)
+                    elif self.output_path(entry.path) is not None:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        notebooks[entry.path] = (st.st_size, st.st_mtime_ns)
+        return notebooks
+
+    def _add_watch(self, directory):
+        # Vanished and unreadable directories are skipped; running out of
+        # watches (ENOSPC) is raised so the caller can fall back to polling
+        try:
+            self._inotify.add(directory)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
+            return False
+        return True
+
+    def _stop_inotify(self):
+        # Out of watches (or closed): fall back to polling from now on
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._next_poll = time.monotonic()
+
+    def _touch(self, path, now):
+        first, _ = self._pending.get(path, (now, now))
+        self._pending[path] = (first, now)
+
+    def _handle_events(self, events, now):
+        for path, mask in events:
+            try:
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped: look at everything again
+                    for notebook_path in set(self._known).union(self._scan(watch=True)):
+                        self._touch(notebook_path, now)
+                elif mask & (IN_ISDIR | IN_DELETE_SELF):
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        if self._is_watched_directory(path):
+                            # Notebooks may have been written before the watch was added
+                            for notebook_path in self._scan([path], watch=True):
+                                self._touch(notebook_path, now)
+                    elif mask & (IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF):
+                        self._inotify.remove_tree(path)
+                        prefix = path + os.sep
+                        for notebook_path in self._known:
+                            if notebook_path.startswith(prefix):
+                                self._touch(notebook_path, now)
+                elif (mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE)
+                      and self.output_path(path) is not None):
+                    self._touch(path, now)
+            except OSError:
+                self._stop_inotify()
+                return
+
+    def _poll(self, now):
+        notebooks = self._scan()
+        for path, stat in notebooks.items():
+            if self._known.get(path) != stat:
+                self._touch(path, now)
+        for path, stat in self._known.items():
+            if path not in notebooks:
+                if stat is not None:
+                    self._touch(path, now)
+                # Kept, as gone, until _due reports it
+                notebooks[path] = None
+        self._known = notebooks
+        self._next_poll = now + self.poll_interval
+
+    def _due(self, now):
+        """Take the pending notebooks that are ready, as (changed, removed)."""
+        changed = []
+        removed = []
+        for path, (first, last) in list(self._pending.items()):
+            if now - last < self.debounce and now - first < self.max_delay:
+                continue
+            del self._pending[path]
+            stat = self._stat(path)
+            if stat is not None:
+                self._known[path] = stat
+                changed.append((path, self.output_path(path)))
+            elif path in self._known:
+                del self._known[path]
+                removed.append((path, self.output_path(path)))
+        return changed, removed
+
+    def _next_due(self):
+        return min((min(first + self.max_delay, last + self.debounce)
+                    for first, last in self._pending.values()), default=None)
+
+    def wait(self, timeout=None):
+        """Block until notebooks have changed or timeout seconds have passed.
+
+        Returns (changed, removed); both are empty after a timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            changed, removed = self._due(now)
+            if changed or removed:
+                return changed, removed
+            if deadline is not None and now >= deadline:
+                return [], []
+            wake = [when for when in (self._next_due(), deadline) if when is not None]
+            if self._inotify is None:
+                wake.append(self._next_poll)
+            delay = max(0, min(wake) - now) if wake else None
+            if self._inotify is None:
+                time.sleep(delay)
+                now = time.monotonic()
+                if now >= self._next_poll:
+                    self._poll(now)
+            else:
+                self._handle_events(self._inotify.read(delay), time.monotonic())
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+File lists for the GUIs
+FileList holds the ordered, duplicate-free paths of the converter and merger
+windows; FileListView shows rows in a Tk Listbox. Both work in bulk, so
+adding, removing, reordering or relabelling any number of rows costs one
+pass over the list and a couple of Tk calls, not a Tk call per row. The
+Listbox itself only draws the rows that are visible.
+"""
+
+import bisect
+
+class FileList:
+    """Ordered list of unique paths with O(1) membership tests.
+
+    extend, remove and move take one pass over the list, however many
+    paths they touch.
+    """
+
+    def __init__(self, paths=()):
+        self._paths = []
+        self._members = set()
+        self.extend(paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __getitem__(self, index):
+        return self._paths[index]
+
+    def __contains__(self, path):
+        return path in self._members
+
+    def extend(self, paths):
+        """Append the paths not in the list yet, in order, and return them."""
+        added = []
+        for path in paths:
+            if path not in self._members:
+                self._members.add(path)
+                added.append(path)
+        self._paths.extend(added)
+        return added
+
+    def remove(self, indices):
+        """Remove the paths at indices."""
+        removed = set(indices)
+        self._members.difference_update(self._paths[index] for index in removed)
+        self._paths = [path for index, path in enumerate(self._paths) if index not in removed]
+
+    def clear(self):
+        self._paths.clear()
+        self._members.clear()
+
+    def move(self, indices, offset):
+        """Move the paths at indices one place up (offset -1) or down (offset 1).
+
+        The paths move together, keeping their order, and nothing moves if
+        one of them is already at that end of the list. Returns their new
+        indices, sorted.
+        """
+        indices = sorted(set(indices))
+        if not indices or offset not in (-1, 1):
+            return indices
+        if (indices[0] == 0) if offset < 0 else (indices[-1] == len(self._paths) - 1):
+            return indices
+        # Swapping from the leading end lets a block of adjacent paths move as one
+        for index in (indices if offset < 0 else reversed(indices)):
+            other = index + offset
+            self._paths[index], self._paths[other] = self._paths[other], self._paths[index]
+        return [index + offset for index in indices]
+
+def _runs(indices):
+    """Split sorted indices into runs of consecutive ones, as [first, last] pairs."""
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index - 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+class FileListView:
+    """Rows of text in a Tk Listbox, mirrored as lists of labels and colors.
+
+    Every delete or insert in a Listbox shifts the rows after it, so an
+    edit is made with one delete and one insert per run of consecutive rows
+    it touches, or, when it is spread over more than MAX_EDIT_RUNS runs, by
+    refilling the Listbox from the mirror in one call.
+    """
+
+    MAX_EDIT_RUNS = 16
+
+    def __init__(self, listbox):
+        self.listbox = listbox
+        self._labels = []
+        self._colors = {}  # row index -> foreground color, for rows that have one
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _refill(self):
+        self.listbox.delete(0, 'end')
+        self.listbox.insert('end', *self._labels)
+        for index, color in self._colors.items():
+            self.listbox.itemconfig(index, fg=color)
+
+    def set(self, labels):
+        """Replace all rows."""
+        self._labels = list(labels)
+        self._colors = {}
+        self._refill()
+
+    def append(self, labels):
+        labels = list(labels)
+        self._labels.extend(labels)
+        self.listbox.insert('end', *labels)
+
+    def delete(self, indices):
+        """Delete the rows at indices."""
+        removed = sorted(set(indices))
+        if not removed:
+            return
+        removed_set = set(removed)
+        self._labels = [label for index, label in enumerate(self._labels) if index not in removed_set]
+        self._colors = {index - bisect.bisect_left(removed, index): color
+                        for index, color in self._colors.items() if index not in removed_set}
+        runs = _runs(removed)
+        if len(runs) > self.MAX_EDIT_RUNS:
+            self._refill()
+            return
+        # From the bottom up, so earlier runs keep their indices
+        for first, last in reversed(runs):
+            self.listbox.delete(first, last)
+
+    def show(self, rows):
+        """Set rows from a {index: (label, color)} dict; color None is the default color.
+
+        Indices past the end are appended, so they must carry on from the
+        last row.
+        """
+        size = len(self._labels)
+        for index in sorted(rows):
+            label, color = rows[index]
+            if index < len(self._labels):
+                self._labels[index] = label
+            else:
+                self._labels.append(label)
+            if color:
+                self._colors[index] = color
+            else:
+                self._colors.pop(index, None)
+        runs = _runs(sorted(rows))
+        if len(runs) > self.MAX_EDIT_RUNS:
+            self._refill()
+            return
+        for first, last in runs:
+            if first < size:
+                self.listbox.delete(first, min(last, size - 1))
+            self.listbox.insert(first, *self._labels[first:last + 1])
+        for index, (_, color) in rows.items():
+            if color:
+                self.listbox.itemconfig(index, fg=color)
+
+    def select(self, indices):
+        """Select exactly the rows at indices and scroll the first into view."""
+        self.listbox.selection_clear(0, 'end')
+        for first, last in _runs(sorted(indices)):
+            self.listbox.selection_set(first, last)
+        if indices:
+            self.listbox.see(min(indices))
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""
+Conversion and merge instrumentation
+Records what each notebook extraction, text save and merge input cost:
+bytes in and out, code cell counts, per-stage timings and peak memory.
+Records are summarised with percentiles and can be written as a JSON-lines
+trace. Nothing is recorded until enable() is called; until then the
+instrumented functions pay for one global lookup per file.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+
+# The active Recorder, or None
+recorder = None
+
+# Environment variable naming a trace file for the GUIs (see enable_from_environment)
+TRACE_ENV = 'IPYNB_TRACE'
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+def start_record(op, path):
+    """Begin a record of one operation on path, or return None when nothing is recorded.
+
+    The instrumented code charges time to stages with lap(), adds fields
+    such as bytes_in or cells to the returned dict, and hands it to
+    finish_record().
+    """
+    if recorder is None:
+        return None
+    if recorder.memory:
+        recorder.tracemalloc.reset_peak()
+    now = time.perf_counter()
+    return {'op': op, 'path': path, '_start': now, '_last': now}
+
+def lap(record, stage):
+    """Charge the time since the previous lap (or the start) to stage, as stage_ms."""
+    if record is not None:
+        now = time.perf_counter()
+        key = stage + '_ms'
+        record[key] = record.get(key, 0) + (now - record['_last']) * 1000
+        record['_last'] = now
+
+def finish_record(record, error=None, **fields):
+    """Complete a record with its total time, peak memory and fields, and pass it on."""
+    if record is None or recorder is None:
+        return
+    record['total_ms'] = (time.perf_counter() - record.pop('_start')) * 1000
+    del record['_last']
+    record.update(fields)
+    if error is not None:
+        record['error'] = str(error)
+    record['peak_rss_mb'] = _peak_rss_mb()
+    if recorder.memory:
+        record['py_peak_mb'] = recorder.tracemalloc.get_traced_memory()[1] / (1 << 20)
+    recorder.add(record)
+
+def _percentile(ordered, fraction):
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+class Summary:
+    """Per-operation totals and stage timing percentiles over a set of records.
+
+    Timings are kept as arrays of doubles, 8 bytes per stage per record, so
+    percentiles are exact even for runs over millions of files.
+    """
+
+    def __init__(self):
+        self.ops = {}
+
+    def add(self, record):
+        op = self.ops.get(record['op'])
+        if op is None:
+            op = self.ops[record['op']] = {'count': 0, 'errors': 0, 'bytes_in': 0,
+                                           'bytes_out': 0, 'chars_out': 0, 'cells': 0,
+                                           'peak_rss_mb': None, 'py_peak_mb': None,
+                                           'timings': {}}
+        op['count'] += 1
+        if 'error' in record:
+            op['errors'] += 1
+        for field in ('bytes_in', 'bytes_out', 'chars_out', 'cells'):
+            op[field] += record.get(field) or 0
+        for field in ('peak_rss_mb', 'py_peak_mb'):
+            if record.get(field) is not None:
+                op[field] = max(op[field] or 0, record[field])
+        for key, value in record.items():
+            if key.endswith('_ms'):
+                timings = op['timings'].get(key[:-3])
+                if timings is None:
+                    timings = op['timings'][key[:-3]] = array('d')
+                timings.append(value)
+
+    def as_dict(self):
+        """Return the summary as plain data: totals and p50/p90/p99/max/sum per stage, in ms."""
+        result = {}
+        for name, op in self.ops.items():
+            stages = {}
+            for stage, timings in op['timings'].items():
+                ordered = sorted(timings)
+                stages[stage] = {'p50': _percentile(ordered, 0.50), 'p90': _percentile(ordered, 0.90),
+                                 'p99': _percentile(ordered, 0.99), 'max': ordered[-1],
+                                 'sum': sum(ordered)}
+            result[name] = dict(op, timings=stages)
+        return result
+
+    def format(self):
+        """Return the summary as printable lines."""
+        lines = []
+        for name, op in sorted(self.as_dict().items()):
+            line = f"{name:<12} n={op['count']:<7}"
+            if op['errors']:
+                line += f" errors={op['errors']}"
+            if op['bytes_in']:
+                line += f" in={op['bytes_in'] / 1e6:.2f}MB"
+            if op['bytes_out']:
+                line += f" out={op['bytes_out'] / 1e6:.2f}MB"
+            if op['chars_out']:
+                line += f" out={op['chars_out'] / 1e6:.2f}M chars"
+            if op['cells']:
+                line += f" cells={op['cells']}"
+            if op['peak_rss_mb'] is not None:
+                line += f" rss={op['peak_rss_mb']:.0f}MB"
+            if op['py_peak_mb'] is not None:
+                line += f" py_peak={op['py_peak_mb']:.1f}MB"
+            lines.append(line)
+            for stage, t in sorted(op['timings'].items(), key=lambda item: item[0] == 'total'):
+                lines.append(f"  {stage:<10} p50={t['p50']:.3f}ms p90={t['p90']:.3f}ms "
+                             f"p99={t['p99']:.3f}ms max={t['max']:.3f}ms sum={t['sum'] / 1000:.2f}s")
+        return lines
+
+class Recorder:
+    """Collects records into a Summary and, with trace_path, a JSON-lines trace.
+
+    Each record is written with a single append, so worker processes can
+    share one trace file (see worker_options). memory=True starts
+    tracemalloc and adds each operation's Python allocation peak to its
+    record; that slows allocation-heavy code down noticeably, unlike the
+    rest. profile_path runs cProfile on the enabling thread and writes its
+    stats there on close, for python -m pstats.
+    """
+
+    def __init__(self, trace_path=None, memory=False, profile_path=None, append=False):
+        self.trace_path = trace_path
+        self.memory = memory
+        self.profile_path = profile_path
+        self.summary = Summary()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._fd = None
+        if trace_path is not None:
+            flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | (0 if append else os.O_TRUNC)
+            self._fd = os.open(trace_path, flags, 0o644)
+        self.tracemalloc = None
+        if memory:
+            import tracemalloc
+            self.tracemalloc = tracemalloc
+            tracemalloc.start()
+        self._profile = None
+        if profile_path is not None:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def add(self, record):
+        record['pid'] = self.pid
+        with self._lock:
+            self.summary.add(record)
+        if self._fd is not None:
+            os.write(self._fd, (json.dumps(record) + '\n').encode('utf-8'))
+
+    def close(self):
+        if self._profile is not None:
+            self._profile.disable()
+            # A forked worker inherits the profiler; only its creator writes the stats
+            if os.getpid() == self.pid:
+                self._profile.dump_stats(self.profile_path)
+        if self.memory:
+            self.tracemalloc.stop()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+def enable(trace_path=None, memory=False, profile_path=None, append=False):
+    """Start recording in this process, replacing any active Recorder, and return it.
+
+    The trace file is truncated unless append is True.
+    """
+    global recorder
+    disable()
+    recorder = Recorder(trace_path, memory, profile_path, append)
+    return recorder
+
+def disable():
+    """Stop recording and return the Recorder that was active, closed, or None."""
+    global recorder
+    active, recorder = recorder, None
+    if active is not None:
+        active.close()
+    return active
+
+def _start_worker(trace_path, memory):
+    # A forked worker inherits the parent's recorder; replace it with one
+    # that appends to the same trace, or drop it
+    if trace_path is None:
+        disable()
+    else:
+        enable(trace_path, memory, append=True)
+
+def worker_options():
+    """Return keyword arguments for multiprocessing.Pool or ProcessPoolExecutor.
+
+    Workers started with them append their records to the active
+    Recorder's trace, so read_trace on it covers the whole run. They never
+    profile.
+    """
+    if recorder is None:
+        return {}
+    return {'initializer': _start_worker, 'initargs': (recorder.trace_path, recorder.memory)}
+
+def enable_from_environment():
+    """Enable tracing to the file named by $IPYNB_TRACE, if it is set, and return the Recorder."""
+    trace_path = os.environ.get(TRACE_ENV)
+    if trace_path:
+        return enable(trace_path)
+    return None
+
+def read_trace(trace_path, summary=None):
+    """Build a Summary from a JSON-lines trace file, or add the file to summary."""
+    summary = summary if summary is not None else Summary()
+    with open(trace_path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                summary.add(json.loads(line))
+    return summary
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise instrumentation traces.")
+    parser.add_argument("traces", nargs="+", help="JSON-lines trace files")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = Summary()
+    for trace_path in args.traces:
+        read_trace(trace_path, summary)
+    if args.json:
+        print(json.dumps(summary.as_dict(), indent=2))
+    else:
+        print("\n".join(summary.format()))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -4,48 +4,59 @@ Jupyter Notebook to Text Converter
 This script extracts code cells from Jupyter notebooks and saves them as plain text files.
 """
 
-import json
 import os
+import queue
 import sys
-import tkinter as tk
-from tkinter import filedialog, messagebox
+import threading
+import time
+from collections import deque
 
-def extract_code_from_notebook(notebook_path):
-    """Extract only code cells from a Jupyter notebook."""
-    try:
-        with open(notebook_path, 'r', encoding='utf-8') as f:
-            notebook = json.load(f)
-        
-        code_content = []
-        
-        # Verify this is a Jupyter notebook
-        if 'cells' not in notebook:
-            raise ValueError("This file does not appear to be a valid Jupyter notebook.")
-            
-        for cell in notebook['cells']:
-            if cell['cell_type'] == 'code':
-                # Only extract the source code, not the outputs
-                code = ''.join(cell['source'])
-                # Add a newline if it doesn't end with one
-                if code and not code.endswith('\n'):
-                    code += '\n'
-                code_content.append(code)
-                
-        return '\n'.join(code_content)
-    except Exception as e:
-        raise Exception(f"Error processing {notebook_path}: {str(e)}")
+import instrumentation
+from converter_cells import CELL_TYPES, OUTPUT_FORMATS, build_extractor
+from converter_core import (
+    CACHE_FILE_NAME,
+    COMPRESSION_CODECS,
+    COMPRESSION_SUFFIXES,
+    ConversionCache,
+    DEDUP_MODES,
+    DuplicateOutputs,
+    FULL_PARSE_MAX_BYTES,
+    OutputArchive,
+    OutputClaims,
+    archive_output_name,
+    archive_stem,
+    convert_notebook,
+    extract_code_from_notebook,
+    find_notebooks,
+    is_archive_path,
+    iter_archive_notebooks,
+    member_path,
+    parse_archive_member,
+    parse_notebook,
+    save_as_text,
+    text_output_path,
+)
+from file_list import FileList, FileListView
 
-def save_as_text(code_content, output_path):
-    """Save the extracted code to a text file."""
-    try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(code_content)
-        return True
-    except Exception as e:
-        raise Exception(f"Error saving to {output_path}: {str(e)}")
+# tkinter is only imported when the GUI starts (see _import_tk), so the
+# command-line mode works on machines without Tk and starts faster.
+tk = filedialog = messagebox = ttk = None
+
+# How often the GUI drains results from its worker thread, and how many per tick
+POLL_INTERVAL_MS = 100
+POLL_BATCH_SIZE = 500
+
+# Reads/writes in flight when --dedup switches the command line to the pipeline
+DEDUP_IO_CONCURRENCY = 16
+
+def _import_tk():
+    global tk, filedialog, messagebox, ttk
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
 
 class NotebookConverterApp:
     def __init__(self, root):
+        _import_tk()
         self.root = root
         self.root.title("Jupyter Notebook to Text Converter")
         self.root.geometry("600x400")
@@ -86,6 +97,16 @@ class NotebookConverterApp:
         )
         self.select_button.grid(row=0, column=0, padx=10)
         
+        # Select folder button
+        self.select_folder_button = tk.Button(
+            button_frame,
+            text="Select Notebook Folder",
+            command=self.select_folder,
+            width=20,
+            height=2
+        )
+        self.select_folder_button.grid(row=1, column=0, padx=10, pady=(5, 0))
+        
         # Convert button
         self.convert_button = tk.Button(
             button_frame,
@@ -97,6 +118,17 @@ class NotebookConverterApp:
         )
         self.convert_button.grid(row=0, column=1, padx=10)
         
+        # Cancel button
+        self.cancel_button = tk.Button(
+            button_frame,
+            text="Cancel",
+            command=self.cancel_conversion,
+            width=20,
+            height=2,
+            state=tk.DISABLED
+        )
+        self.cancel_button.grid(row=1, column=1, padx=10, pady=(5, 0))
+        
         # Status frame
         status_frame = tk.Frame(main_frame)
         status_frame.pack(fill=tk.X, pady=(20, 0))
@@ -113,6 +145,10 @@ class NotebookConverterApp:
         )
         self.status_label.pack(fill=tk.X)
         
+        # Progress bar
+        self.progress_bar = ttk.Progressbar(status_frame, mode='determinate')
+        self.progress_bar.pack(fill=tk.X, pady=(5, 0))
+        
         # Selected files list frame
         list_frame = tk.Frame(main_frame)
         list_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
@@ -129,32 +165,54 @@ class NotebookConverterApp:
         )
         self.files_listbox.pack(fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.files_listbox.yview)
+        self.files_view = FileListView(self.files_listbox)
         
         # Instance variables
-        self.selected_files = []
+        self.selected_files = FileList()
+        self.source_root = None
+        self.results = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
     
     def select_files(self):
         """Open file dialog to select Jupyter notebook files."""
-        filetypes = [("Jupyter Notebooks", "*.ipynb"), ("All Files", "*.*")]
+        filetypes = [("Jupyter Notebooks", "*.ipynb"),
+                     ("Compressed Notebooks", "*.ipynb.gz *.ipynb.bz2 *.ipynb.xz *.ipynb.zst"),
+                     ("All Files", "*.*")]
         files = filedialog.askopenfilenames(
             title="Select Jupyter Notebook Files",
             filetypes=filetypes
         )
         
         if files:
-            self.selected_files = list(files)
-            self.files_listbox.delete(0, tk.END)
-            for file in self.selected_files:
-                self.files_listbox.insert(tk.END, os.path.basename(file))
+            self.source_root = None
+            self.selected_files = FileList(files)
+            self.files_view.set([os.path.basename(file) for file in self.selected_files])
             
             self.status_label.config(text=f"Selected {len(self.selected_files)} file(s). Ready to convert.")
             self.convert_button.config(state=tk.NORMAL)
         else:
             self.status_label.config(text="No files selected.")
     
+    def select_folder(self):
+        """Open a dialog to select a folder whose notebooks are converted recursively."""
+        folder = filedialog.askdirectory(title="Select Folder Containing Notebooks")
+        
+        if folder:
+            self.source_root = folder
+            self.selected_files = FileList()
+            self.files_view.set([])
+            self.status_label.config(
+                text=f"Selected folder {os.path.basename(folder) or folder}. "
+                     "Notebooks in it and its subfolders will be converted."
+            )
+            self.convert_button.config(state=tk.NORMAL)
+        else:
+            self.status_label.config(text="No folder selected.")
+    
     def convert_files(self):
         """Convert selected notebook files to text files."""
-        if not self.selected_files:
+        if not self.selected_files and not self.source_root:
             messagebox.showinfo("No Files", "Please select notebook files first.")
             return
         
@@ -164,39 +222,604 @@ class NotebookConverterApp:
             self.status_label.config(text="Conversion cancelled. No output directory selected.")
             return
         
-        success_count = 0
-        error_messages = []
+        # Convert on a background thread so the window stays responsive;
+        # results come back through self.results and are polled below.
+        self.cancel_event.clear()
+        self.success_count = 0
+        self.processed_count = 0
+        self.error_messages = []
+        self.start_time = time.perf_counter()
         
-        for notebook_path in self.selected_files:
+        if self.source_root:
+            # The folder is walked on the worker thread while converting, with
+            # its layout mirrored under output_dir; rows are added as notebooks
+            # are found.
+            self.selected_files = FileList()
+            self.files_view.set([])
+            tasks = find_notebooks([self.source_root], output_dir)
+            self.progress_bar.config(mode='indeterminate', value=0)
+            self.progress_bar.start()
+            self.status_label.config(text="Searching and converting notebooks...")
+        else:
+            tasks = [(path, text_output_path(path, output_dir)) for path in self.selected_files]
+            self.progress_bar.config(mode='determinate', maximum=len(self.selected_files), value=0)
+            self.status_label.config(text=f"Converting {len(self.selected_files)} notebooks...")
+        self.select_button.config(state=tk.DISABLED)
+        self.select_folder_button.config(state=tk.DISABLED)
+        self.convert_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        
+        self.worker = threading.Thread(
+            target=self._convert_worker,
+            args=(tasks, output_dir),
+            daemon=True
+        )
+        self.worker.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll_results)
+    
+    def cancel_conversion(self):
+        """Ask the background conversion to stop after the current file."""
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Cancelling...")
+    
+    def _convert_worker(self, tasks, output_dir):
+        """Convert (notebook, output) pairs on the worker thread, reporting each one through self.results."""
+        cache = ConversionCache(os.path.join(output_dir, CACHE_FILE_NAME))
+        claims = OutputClaims()
+        
+        for index, (notebook_path, output_path) in enumerate(tasks):
+            if self.cancel_event.is_set():
+                break
+            other = claims.claim(notebook_path, output_path)
+            if other is not None:
+                self.results.put(('file', index, notebook_path, "error",
+                                  f"Error converting {os.path.basename(notebook_path)}: "
+                                  f"{os.path.basename(other)} is converted into "
+                                  f"{os.path.basename(output_path)} as well; rename one to convert both"))
+                continue
             try:
-                # Extract base filename without extension
-                base_name = os.path.splitext(os.path.basename(notebook_path))[0]
-                output_path = os.path.join(output_dir, f"{base_name}.txt")
-                
-                # Extract code and save as text
-                code_content = extract_code_from_notebook(notebook_path)
-                save_as_text(code_content, output_path)
-                
-                success_count += 1
+                # Extract code and save as text, unless nothing changed
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                up_to_date, previous = cache.lookup(notebook_path, output_path)
+                status = "unchanged"
+                if not up_to_date:
+                    entry, written = convert_notebook(notebook_path, output_path, previous)
+                    cache.record(notebook_path, entry)
+                    if written:
+                        status = "converted"
+                self.results.put(('file', index, notebook_path, status, None))
             except Exception as e:
-                error_messages.append(f"Error converting {os.path.basename(notebook_path)}: {str(e)}")
+                self.results.put(('file', index, notebook_path, "error",
+                                  f"Error converting {os.path.basename(notebook_path)}: {str(e)}"))
+        
+        try:
+            cache.save()
+        except OSError as e:
+            self.results.put(('file', None, None, "error", f"Could not save conversion cache: {str(e)}"))
+        self.results.put(('done', None, None, None, None))
+    
+    def _poll_results(self):
+        """Apply worker results to the UI; reschedules itself until the worker is done."""
+        done = False
+        rows = {}
+        for _ in range(POLL_BATCH_SIZE):
+            try:
+                kind, index, notebook_path, status, message = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'done':
+                done = True
+                break
+            if message:
+                self.error_messages.append(message)
+            if index is None:
+                continue
+            
+            self.processed_count += 1
+            if status != "error":
+                self.success_count += 1
+            # Show the per-file status in the list, adding rows for notebooks
+            # found while converting a folder
+            name = os.path.basename(notebook_path)
+            if index >= len(self.selected_files):
+                self.selected_files.extend([notebook_path])
+            rows[index] = (f"{name}  [{status}]", "red" if status == "error" else None)
+        self.files_view.show(rows)
+        
+        total = len(self.selected_files)
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        if not self.source_root:
+            self.progress_bar.config(value=self.processed_count)
+        
+        if not done:
+            of_total = "" if self.source_root else f" of {total}"
+            self.status_label.config(
+                text=f"Converting {self.processed_count}{of_total} "
+                     f"({self.processed_count / elapsed:.1f} files/s)"
+            )
+            self.root.after(POLL_INTERVAL_MS, self._poll_results)
+            return
+        
+        self.worker = None
+        if self.source_root:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode='determinate', maximum=max(total, 1), value=total)
+        self.select_button.config(state=tk.NORMAL)
+        self.select_folder_button.config(state=tk.NORMAL)
+        self.convert_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        rate = f"{self.processed_count / elapsed:.1f} files/s"
         
         # Show results
-        if error_messages:
-            error_text = "\n".join(error_messages)
-            messagebox.showerror("Conversion Errors", f"Encountered {len(error_messages)} error(s):\n\n{error_text}")
+        if self.error_messages:
+            error_text = "\n".join(self.error_messages)
+            messagebox.showerror("Conversion Errors", f"Encountered {len(self.error_messages)} error(s):\n\n{error_text}")
         
-        if success_count > 0:
+        if self.cancel_event.is_set():
+            self.status_label.config(text=f"Cancelled after {self.success_count} of {total} notebooks ({rate}).")
+        elif self.success_count > 0:
             messagebox.showinfo("Conversion Complete", 
-                              f"Successfully converted {success_count} of {len(self.selected_files)} notebooks to text files.")
-            self.status_label.config(text=f"Converted {success_count} of {len(self.selected_files)} notebooks.")
+                              f"Successfully converted {self.success_count} of {total} notebooks to text files.")
+            self.status_label.config(text=f"Converted {self.success_count} of {total} notebooks ({rate}).")
         else:
             self.status_label.config(text="Conversion failed. Please check error messages.")
 
+def _convert_task(task, compression_level=None, extractor=None):
+    """Worker entry point for the command-line mode. Never raises."""
+    notebook_path, output_path, previous = task
+    try:
+        entry, written = convert_notebook(notebook_path, output_path, previous,
+                                          compression_level=compression_level, extractor=extractor)
+        return notebook_path, output_path, entry, written, None
+    except Exception as e:
+        return notebook_path, output_path, None, False, str(e)
+
+def run_pool(tasks, handle_result, jobs, compression_level=None, extractor=None):
+    """Convert tasks on a pool of worker processes, passing each result to handle_result."""
+    import functools
+    convert_task = functools.partial(_convert_task, compression_level=compression_level,
+                                     extractor=extractor)
+    if jobs <= 1:
+        for result in map(convert_task, tasks):
+            handle_result(*result)
+        return
+    
+    import multiprocessing
+    with multiprocessing.Pool(jobs, **instrumentation.worker_options()) as pool:
+        for result in pool.imap_unordered(convert_task, tasks, chunksize=4):
+            handle_result(*result)
+
+def _parse_member(item, extractor=None):
+    """Worker entry point for archive members. Never raises."""
+    notebook_path, data = item
+    try:
+        return parse_notebook(notebook_path, data, extractor)[0], None
+    except Exception as e:
+        return None, str(e)
+
+def iter_archive_results(archive_paths, include, exclude, jobs, extractor=None):
+    """Convert the notebooks inside archives without extracting them.
+
+    Yields (notebook_path, member_name, archive_path, size, code_content,
+    error) in archive order. Each archive is read in one sequential pass on
+    this thread. Members up to FULL_PARSE_MAX_BYTES are parsed on jobs
+    worker processes, at most jobs * 4 ahead; larger ones are streamed
+    through the parser right here, so they are never held in memory.
+    """
+    executor = None
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(jobs, **instrumentation.worker_options())
+    pending = deque()
+    
+    def finish(item):
+        notebook_path, member_name, archive_path, size, result = item
+        code_content, error = result.result() if hasattr(result, 'result') else result
+        return notebook_path, member_name, archive_path, size, code_content, error
+    
+    try:
+        for archive_path in archive_paths:
+            try:
+                for member_name, size, f in iter_archive_notebooks(archive_path, include, exclude):
+                    notebook_path = member_path(archive_path, member_name)
+                    if size > FULL_PARSE_MAX_BYTES:
+                        try:
+                            result = parse_archive_member(notebook_path, f, size, extractor)[0], None
+                        except Exception as e:
+                            result = None, str(e)
+                    elif executor is not None:
+                        result = executor.submit(_parse_member, (notebook_path, f.read()), extractor)
+                    else:
+                        result = _parse_member((notebook_path, f.read()), extractor)
+                    pending.append((notebook_path, member_name, archive_path, size, result))
+                    while len(pending) > (jobs * 4 if executor is not None else 0):
+                        yield finish(pending.popleft())
+            except Exception as e:
+                # Unreadable or truncated archive: report it, keep what was read
+                while pending:
+                    yield finish(pending.popleft())
+                yield archive_path, None, archive_path, 0, None, f"Error reading {archive_path}: {str(e)}"
+        while pending:
+            yield finish(pending.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def run_pipeline(tasks, handle_result, args, dedup=None, extractor=None):
+    """Convert tasks with the asyncio read/parse/write pipeline."""
+    from converter_pipeline import convert_notebooks_pipelined
+    
+    if args.jobs <= 1:
+        convert_notebooks_pipelined(tasks, handle_result, io_concurrency=args.io_concurrency,
+                                    parse_workers=1, queue_depth=args.queue_depth, dedup=dedup,
+                                    compression_level=args.compression_level, extractor=extractor)
+        return
+    
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(args.jobs, **instrumentation.worker_options()) as parse_executor:
+        convert_notebooks_pipelined(tasks, handle_result, io_concurrency=args.io_concurrency,
+                                    parse_executor=parse_executor, parse_workers=args.jobs,
+                                    queue_depth=args.queue_depth, dedup=dedup,
+                                    compression_level=args.compression_level, extractor=extractor)
+
+def run_cli(argv):
+    """Convert notebooks without the GUI. Returns the process exit code."""
+    import argparse
+    from converter_watch import DEBOUNCE_SECONDS, MAX_DELAY_SECONDS, POLL_INTERVAL_SECONDS
+
+    parser = argparse.ArgumentParser(
+        description="Extract the code cells of Jupyter notebooks into text files."
+    )
+    parser.add_argument("inputs", nargs="+",
+                        help="notebook files, directories (converted recursively), glob patterns "
+                             "or .zip/.tar[.gz|.bz2|.xz] archives (read without extracting)")
+    parser.add_argument("-o", "--output-dir",
+                        help="directory for the outputs; directory inputs are mirrored "
+                             "under it (default: next to each notebook)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only report errors and the final summary")
+    parser.add_argument("--include", action="append", metavar="PATTERN",
+                        help="only convert notebooks in directory inputs whose relative path "
+                             "matches this glob (may be repeated)")
+    parser.add_argument("--exclude", action="append", metavar="PATTERN",
+                        help="skip files and directories whose relative path matches this glob "
+                             "(may be repeated)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default='text',
+                        help="text: cells separated by blank lines (.txt, the default); py: a "
+                             "percent-format script with '# %%%%' cell markers (.py); jsonl: one "
+                             "JSON object per cell (.jsonl)")
+    parser.add_argument("--cells", default='code', metavar="TYPES",
+                        help=f"comma-separated cell types to extract, from {', '.join(CELL_TYPES)} "
+                             f"(default: code)")
+    parser.add_argument("--tag", action="append", metavar="TAG",
+                        help="only extract cells that have this tag (may be repeated)")
+    parser.add_argument("--skip-tag", action="append", metavar="TAG",
+                        help="leave out cells that have this tag (may be repeated)")
+    parser.add_argument("--strip-magics", action="store_true",
+                        help="remove IPython magic (%%time) and shell (!ls) lines from code "
+                             "cells, and cells of non-Python cell magics (%%%%bash)")
+    parser.add_argument("--comment-markdown", action="store_true",
+                        help="write markdown cells as '#' comments (the py format always does)")
+    parser.add_argument("--cell-markers", action="store_true",
+                        help="precede each cell with a '# Cell N' line (text format)")
+    parser.add_argument("--io-concurrency", type=int, metavar="N",
+                        help="use the asyncio pipeline with up to N reads/writes in flight; "
+                             "helps on network filesystems")
+    parser.add_argument("--queue-depth", type=int, default=64, metavar="N",
+                        help="items buffered between pipeline stages (default: 64)")
+    parser.add_argument("--cache", metavar="FILE",
+                        help=f"conversion manifest (default: {CACHE_FILE_NAME} in the output directory)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="convert every notebook even if it has not changed")
+    parser.add_argument("--dedup", choices=DEDUP_MODES,
+                        help="for notebooks whose code matches one already converted, write "
+                             "nothing (skip) or a one-line pointer to the first output "
+                             "(reference); implies the asyncio pipeline")
+    parser.add_argument("--compress", choices=COMPRESSION_CODECS,
+                        help="write compressed outputs (.txt.gz, .txt.zst, ...); zstd needs the "
+                             "zstandard package. Compressed notebooks (.ipynb.gz, ...) are always "
+                             "read transparently")
+    parser.add_argument("--compression-level", type=int, metavar="N",
+                        help="codec compression level (default: gzip 6, bz2 9, xz 6, zstd 3)")
+    parser.add_argument("--output-archive", metavar="FILE",
+                        help="write the outputs of archive inputs as members of this .zip or "
+                             ".tar[.gz|.bz2|.xz] instead of as separate files")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write a JSON-lines record of every notebook read and output written "
+                             "(stage timings, bytes, cells, peak memory) and print a summary "
+                             "with percentiles")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record each operation's Python allocation peak with "
+                             "tracemalloc (slows conversion down)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="run cProfile on the main process and write its stats to FILE; "
+                             "parsing runs in workers unless -j 1")
+    parser.add_argument("--watch", action="store_true",
+                        help="after converting, keep watching the directory and notebook inputs: "
+                             "reconvert notebooks as they are saved and delete the outputs of "
+                             "deleted ones, until interrupted with Ctrl-C")
+    parser.add_argument("--poll", action="store_true",
+                        help="with --watch, rescan for changes instead of using inotify "
+                             "(needed on network filesystems)")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL_SECONDS,
+                        metavar="SECONDS",
+                        help=f"with --watch, how often to rescan when polling "
+                             f"(default: {POLL_INTERVAL_SECONDS:g})")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS, metavar="SECONDS",
+                        help=f"with --watch, wait until a notebook has not changed for this long "
+                             f"before converting it (default: {DEBOUNCE_SECONDS:g}; at most "
+                             f"{MAX_DELAY_SECONDS:g}s after its first change)")
+    args = parser.parse_args(argv)
+    if args.trace_memory and not args.trace:
+        parser.error("--trace-memory needs --trace")
+    cell_types = [cell_type.strip() for cell_type in args.cells.split(',') if cell_type.strip()]
+    if not cell_types or not set(cell_types) <= set(CELL_TYPES):
+        parser.error(f"--cells takes a comma-separated list of {', '.join(CELL_TYPES)}")
+    if args.cell_markers and args.format != 'text':
+        parser.error("--cell-markers only applies to --format text")
+    extractor = build_extractor(args.format, cell_types, args.tag, args.skip_tag,
+                                args.strip_magics, args.comment_markdown, args.cell_markers)
+
+    archive_inputs = [item for item in args.inputs if is_archive_path(item) and os.path.isfile(item)]
+    args.inputs = [item for item in args.inputs if item not in archive_inputs]
+    if args.output_archive and args.inputs:
+        parser.error("--output-archive only applies to archive inputs")
+    # An archive's outputs go under a folder named after it without its
+    # suffix, so x.zip and x.tar.gz would overwrite each other's
+    archive_folders = {}
+    for archive_path in archive_inputs:
+        output_root = '' if args.output_archive else args.output_dir or os.path.dirname(archive_path)
+        folder = os.path.normpath(os.path.join(output_root, archive_stem(archive_path)))
+        other = archive_folders.setdefault(folder, archive_path)
+        if os.path.abspath(other) != os.path.abspath(archive_path):
+            parser.error(f"{other} and {archive_path} would both be converted into {folder}; "
+                         f"convert them separately or rename one")
+    if args.watch:
+        import glob
+        if archive_inputs or any(glob.has_magic(item) for item in args.inputs):
+            parser.error("--watch takes directories and notebook files, not archives or patterns")
+        if args.dedup:
+            parser.error("--watch can't be combined with --dedup")
+
+    output_suffix = ''
+    if args.compress:
+        output_suffix = {codec: suffix for suffix, codec in COMPRESSION_SUFFIXES.items()}[args.compress]
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    dedup = DuplicateOutputs(args.dedup) if args.dedup else None
+    cache = None
+    if args.inputs and not args.no_cache:
+        cache = ConversionCache(args.cache or os.path.join(args.output_dir or '.', CACHE_FILE_NAME),
+                                extractor=extractor)
+        if dedup is not None:
+            # Outputs kept from earlier runs stay the first copy of their code
+            for code_hash, output_path in cache.current_outputs():
+                dedup.remember(code_hash, output_path)
+
+    success_count = 0
+    error_count = 0
+    skipped_count = 0
+    unchanged_count = 0
+    clash_count = 0  # counted apart from error_count, as tasks() runs in the pool's feeder thread
+    bytes_in = 0
+    code_bytes = 0
+    output_bytes = 0
+
+    claims = OutputClaims()
+
+    def refuse_clash(notebook_path, output_path):
+        nonlocal clash_count
+        other = claims.claim(notebook_path, output_path)
+        if other is None:
+            return False
+        clash_count += 1
+        print(f"ERROR {other} and {notebook_path} would both be converted into {output_path}; "
+              f"rename one to convert both", file=sys.stderr)
+        return True
+
+    # Discovery runs lazily inside the pool's task feeder, so conversion
+    # starts as soon as the first notebook is found.
+    def tasks():
+        nonlocal skipped_count
+        created_dirs = set()
+        for notebook_path, output_path in find_notebooks(args.inputs, args.output_dir, args.include,
+                                                         args.exclude, extractor.suffix):
+            output_path += output_suffix
+            if refuse_clash(notebook_path, output_path):
+                continue
+            output_parent = os.path.dirname(output_path)
+            if output_parent not in created_dirs:
+                os.makedirs(output_parent or '.', exist_ok=True)
+                created_dirs.add(output_parent)
+            previous = None
+            if cache is not None:
+                up_to_date, previous = cache.lookup(notebook_path, output_path)
+                if up_to_date:
+                    skipped_count += 1
+                    continue
+            yield notebook_path, output_path, previous
+
+    def handle_result(notebook_path, output_path, entry, written, error):
+        nonlocal success_count, error_count, unchanged_count, bytes_in, code_bytes, output_bytes
+        if error:
+            error_count += 1
+            print(f"ERROR {error}", file=sys.stderr)
+            return
+        success_count += 1
+        bytes_in += entry['size']
+        if written:
+            code_bytes += entry['code_size']
+            output_bytes += entry['output_size']
+        if cache is not None:
+            cache.record(notebook_path, entry)
+        if 'duplicate_of' in entry:
+            note = f" (duplicate of {entry['duplicate_of']})"
+        elif not written:
+            unchanged_count += 1
+            note = " (unchanged)"
+        else:
+            note = ""
+        if not args.quiet:
+            print(f"{notebook_path} -> {output_path}{note}")
+
+    def convert_archives():
+        # Archive members are converted in archive order and written here;
+        # the cache and dedup don't apply to them.
+        nonlocal success_count, error_count, bytes_in, code_bytes, output_bytes
+        output_archive = None
+        if args.output_archive:
+            output_archive = OutputArchive(args.output_archive, args.compression_level)
+        try:
+            for notebook_path, member_name, archive_path, size, code_content, error in \
+                    iter_archive_results(archive_inputs, args.include, args.exclude, args.jobs,
+                                         extractor):
+                if not error:
+                    output_name = archive_output_name(archive_path, member_name, extractor.suffix)
+                    if output_archive is not None:
+                        output_path = member_path(args.output_archive, output_name)
+                    else:
+                        output_root = args.output_dir or os.path.dirname(archive_path)
+                        output_path = os.path.join(output_root, *output_name.split('/')) + output_suffix
+                    if refuse_clash(notebook_path, output_path):
+                        continue
+                    try:
+                        if output_archive is not None:
+                            output_archive.add(output_name, code_content)
+                        else:
+                            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                            save_as_text(code_content, output_path, args.compression_level)
+                            if args.compress:
+                                code_bytes += len(code_content.encode('utf-8'))
+                                output_bytes += os.path.getsize(output_path)
+                    except Exception as e:
+                        error = f"Error processing {notebook_path}: {str(e)}"
+                if error:
+                    error_count += 1
+                    print(f"ERROR {error}", file=sys.stderr)
+                    continue
+                success_count += 1
+                bytes_in += size
+                if not args.quiet:
+                    print(f"{notebook_path} -> {output_path}")
+        finally:
+            if output_archive is not None:
+                output_archive.close()
+
+    def convert(tasks, jobs):
+        if args.dedup:
+            # Duplicates are claimed where outputs are written, so every
+            # write has to happen in this process
+            args.io_concurrency = args.io_concurrency or DEDUP_IO_CONCURRENCY
+            run_pipeline(tasks, handle_result, args, dedup, extractor)
+        elif args.io_concurrency:
+            run_pipeline(tasks, handle_result, args, extractor=extractor)
+        else:
+            run_pool(tasks, handle_result, jobs, args.compression_level, extractor)
+
+    def watch(watcher):
+        # Notebooks are converted in batches as the watcher reports them, on
+        # no more workers than the batch has notebooks, so a single save is
+        # converted right here without starting a pool
+        print(f"Watching for changes ({watcher.mode}); press Ctrl-C to stop", flush=True)
+        while True:
+            changed, removed = watcher.wait()
+            batch = []
+            for notebook_path, output_path in changed:
+                if refuse_clash(notebook_path, output_path + output_suffix):
+                    continue
+                os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+                previous = None
+                if cache is not None:
+                    up_to_date, previous = cache.lookup(notebook_path, output_path + output_suffix)
+                    if up_to_date:
+                        continue
+                batch.append((notebook_path, output_path + output_suffix, previous))
+            if batch:
+                convert(batch, min(args.jobs, len(batch)))
+            for notebook_path, output_path in removed:
+                claims.release(notebook_path, output_path + output_suffix)
+                # Only outputs this tool wrote (recorded in the manifest) are deleted
+                entry = cache.forget(notebook_path) if cache is not None else None
+                if entry is None or entry['output_size'] is None:
+                    continue
+                try:
+                    os.remove(entry['output'])
+                except FileNotFoundError:
+                    pass
+                if not args.quiet:
+                    print(f"{notebook_path} deleted, removed {entry['output']}")
+            if cache is not None and (batch or removed):
+                # A watcher can run for days; don't leave the manifest to the end
+                cache.save()
+            sys.stdout.flush()
+
+    watcher = None
+    if args.watch:
+        # Started before the first pass so that saves made during it are seen
+        from converter_watch import NotebookWatcher
+        watcher = NotebookWatcher(args.inputs, args.output_dir, args.include, args.exclude,
+                                  debounce=args.debounce, poll=args.poll,
+                                  poll_interval=args.poll_interval, suffix=extractor.suffix)
+
+    if args.trace or args.profile:
+        instrumentation.enable(args.trace, args.trace_memory, args.profile)
+    start = time.perf_counter()
+
+    try:
+        if args.inputs:
+            convert(tasks(), args.jobs)
+        if archive_inputs:
+            convert_archives()
+        if watcher is not None:
+            if cache is not None:
+                cache.save()
+            # Stop on SIGTERM (a service manager, kill) as on Ctrl-C, so the
+            # watcher is closed and the manifest saved
+            import signal
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            try:
+                watch(watcher)
+            except KeyboardInterrupt:
+                pass
+    finally:
+        if watcher is not None:
+            watcher.close()
+        if cache is not None:
+            cache.save()
+        instrumentation.disable()
+    error_count += clash_count
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    total = success_count + error_count + skipped_count
+    print(f"Converted {success_count} of {total} notebooks "
+          f"in {elapsed:.2f}s ({success_count / elapsed:.1f} files/s, "
+          f"{bytes_in / elapsed / 1e6:.1f} MB/s); "
+          f"{skipped_count} skipped as unchanged, {unchanged_count} outputs already identical")
+    if args.compress and output_bytes:
+        print(f"Compressed {code_bytes / 1e6:.2f} MB of text to {output_bytes / 1e6:.2f} MB "
+              f"with {args.compress} (ratio {code_bytes / output_bytes:.2f}, "
+              f"{code_bytes / elapsed / 1e6:.1f} MB/s)")
+    if dedup is not None:
+        print(f"{dedup.duplicate_count} duplicates, {dedup.bytes_saved / 1e6:.2f} MB saved")
+    if args.trace:
+        # Read back from the trace, which worker processes append to as well
+        print("\n".join(instrumentation.read_trace(args.trace).format()))
+    if args.profile:
+        print(f"Profile written to {args.profile} (see python -m pstats)")
+    return 1 if error_count else 0
+
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    _import_tk()
+    instrumentation.enable_from_environment()
     root = tk.Tk()
     app = NotebookConverterApp(root)
     root.mainloop()
+    instrumentation.disable()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,775 @@
+"""
+Text merging core
+Concatenates text files into a single output file. This module has no GUI
+dependencies; text_file_merger.py builds the GUI on top of it.
+"""
+
+import codecs
+import contextlib
+import errno
+import itertools
+import json
+import mmap
+import os
+import sys
+from collections import deque
+from datetime import datetime
+
+from converter_core import (
+    DEDUP_MODES,
+    compression_for_path,
+    extract_code_from_notebook,
+    is_archive_path,
+    is_notebook_path,
+    iter_archive,
+    make_temp_file,
+    member_path,
+    new_hash,
+    open_archive_member,
+    open_compressed,
+    split_member_path,
+)
+from instrumentation import finish_record, lap, start_record
+
+# Inputs are copied as raw bytes, by the kernel where the OS allows it
+# (copy_file_range, then sendfile), otherwise in chunks of this size.
+COPY_CHUNK_SIZE = 1 << 20
+KERNEL_COPY_SIZE = 1 << 30
+_KERNEL_COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+                            errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTSOCK}
+
+# Index sidecar written next to a merged file (see write_index)
+INDEX_SUFFIX = '.index.json'
+INDEX_VERSION = 2
+INDEX_FIELDS = ['number', 'offset', 'length', 'name', 'path', 'hash', 'size', 'mtime_ns']
+
+# Largest text input read ahead by the parallel merge; bigger ones are streamed
+PREFETCH_MAX_BYTES = 8 << 20
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _copy_fd(in_fd, out_fd):
+    """Copy the rest of in_fd to out_fd at their current offsets."""
+    kernel_copies = []
+    if hasattr(os, 'copy_file_range'):
+        kernel_copies.append(lambda: os.copy_file_range(in_fd, out_fd, KERNEL_COPY_SIZE))
+    if sys.platform.startswith('linux'):
+        kernel_copies.append(lambda: os.sendfile(out_fd, in_fd, None, KERNEL_COPY_SIZE))
+    
+    for kernel_copy in kernel_copies:
+        copied_any = False
+        try:
+            while kernel_copy():
+                copied_any = True
+            if copied_any:
+                return
+            # Nothing copied: either an empty file or a pseudo-file the kernel
+            # can't copy; let the next method decide.
+        except OSError as e:
+            if e.errno not in _KERNEL_COPY_UNSUPPORTED:
+                raise
+    
+    while True:
+        chunk = os.read(in_fd, COPY_CHUNK_SIZE)
+        if not chunk:
+            return
+        _write_all(out_fd, chunk)
+
+def _copy_stream(infile, output, validate):
+    """Copy the rest of a binary stream to a merge output, checking UTF-8 if validate."""
+    decoder = codecs.getincrementaldecoder('utf-8')() if validate else None
+    while True:
+        chunk = infile.read(COPY_CHUNK_SIZE)
+        if decoder is not None:
+            decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            return
+        output.write(chunk)
+
+def _copy_fd_validated(in_fd, out_fd):
+    """Copy the rest of in_fd to out_fd, raising UnicodeDecodeError if it is not UTF-8."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        chunk = os.read(in_fd, COPY_CHUNK_SIZE)
+        decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            return
+        _write_all(out_fd, chunk)
+
+def is_notebook(file_path):
+    """Check whether an input is merged as a notebook (.ipynb, optionally compressed)."""
+    return is_notebook_path(file_path)
+
+def _is_streamed(file_path):
+    # Inputs whose merged bytes can only be had by reading them through:
+    # compressed files and archive members
+    return compression_for_path(file_path) or split_member_path(file_path)[1] is not None
+
+@contextlib.contextmanager
+def _open_text(file_path):
+    """Open a text input as a context manager giving its merged bytes as a binary stream.
+
+    Compressed inputs are decompressed; "<archive>::<member>" inputs are
+    read out of their archive.
+    """
+    archive_path, member_name = split_member_path(file_path)
+    if member_name is None:
+        with open_compressed(file_path) as infile:
+            yield infile
+        return
+    with open_archive_member(archive_path, member_name) as (member, size):
+        with open_compressed(fileobj=member, compression=compression_for_path(member_name)) as infile:
+            yield infile
+
+def _input_stat(file_path):
+    """Stat an input, or the archive holding it for an archive member."""
+    return os.stat(split_member_path(file_path)[0])
+
+def expand_archives(file_paths):
+    """Return file_paths with every .zip/.tar[.gz|.bz2|.xz] file replaced by its members.
+
+    Members become "<archive>::<member>" inputs, in the order they are
+    stored, which merge_files reads in one pass over the archive.
+    """
+    expanded = []
+    for file_path in file_paths:
+        if is_archive_path(file_path) and os.path.isfile(file_path):
+            expanded.extend(member_path(file_path, name) for name, size, f in iter_archive(file_path))
+        else:
+            expanded.append(file_path)
+    return expanded
+
+class _FileOutput:
+    """Merge output written straight to a file descriptor, using kernel copies."""
+
+    can_read_back = True
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def write(self, data):
+        _write_all(self.fd, data)
+
+    def tell(self):
+        return os.lseek(self.fd, 0, os.SEEK_CUR)
+
+    def discard_after(self, position):
+        """Drop everything written after position. Returns True."""
+        os.ftruncate(self.fd, position)
+        os.lseek(self.fd, position, os.SEEK_SET)
+        return True
+
+    def copy_file(self, file_path, validate):
+        with open(file_path, 'rb', buffering=0) as infile:
+            if validate:
+                _copy_fd_validated(infile.fileno(), self.fd)
+            else:
+                _copy_fd(infile.fileno(), self.fd)
+
+    def read_back(self, offset, length):
+        """Yield the chunks of length bytes written at offset."""
+        end = offset + length
+        while offset < end:
+            chunk = os.pread(self.fd, min(COPY_CHUNK_SIZE, end - offset), offset)
+            if not chunk:
+                return
+            yield chunk
+            offset += len(chunk)
+
+class _CompressedOutput:
+    """Merge output streamed through a compressor.
+
+    Compressed bytes can't be taken back or re-read, so discard_after only
+    succeeds when nothing was written past position, and dedup hashes every
+    input up front instead of reading earlier content back.
+    """
+
+    can_read_back = False
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.position = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+
+    def tell(self):
+        return self.position
+
+    def discard_after(self, position):
+        """Return whether the output already ends at position."""
+        return position == self.position
+
+    def copy_file(self, file_path, validate):
+        with open(file_path, 'rb') as infile:
+            _copy_stream(infile, self, validate)
+
+def _write_input(file_path, output, validate):
+    """Append one input to a merge output.
+
+    A text file is copied as raw bytes (decompressed first if it has a
+    codec suffix, read out of its archive if it is a member), a notebook
+    as its extracted code.
+    """
+    if is_notebook(file_path):
+        output.write(extract_code_from_notebook(file_path).encode('utf-8'))
+    elif _is_streamed(file_path):
+        with _open_text(file_path) as infile:
+            _copy_stream(infile, output, validate)
+    else:
+        output.copy_file(file_path, validate)
+
+def _read_input(file_path, validate):
+    """Return an input's bytes as merge_files would write them.
+
+    Returns None for text files above PREFETCH_MAX_BYTES (after
+    decompression); those are streamed by the writer instead, which keeps
+    the reorder buffer small. A plain file's size is checked before it is
+    read; a compressed one is read up to the limit. A notebook's extracted
+    code is returned whatever its size, as extracting it again would cost
+    more than holding it.
+    """
+    if is_notebook(file_path):
+        return extract_code_from_notebook(file_path).encode('utf-8')
+    if not _is_streamed(file_path) and os.stat(file_path).st_size > PREFETCH_MAX_BYTES:
+        return None
+    with _open_text(file_path) as infile:
+        data = infile.read(PREFETCH_MAX_BYTES + 1)
+    if len(data) > PREFETCH_MAX_BYTES:
+        return None
+    if validate:
+        data.decode('utf-8')
+    return data
+
+def _prefetch_input(file_path, validate):
+    """Read an input on a worker thread; see _read_input.
+
+    Archive members are left to the writer, which reads them in order, in
+    one pass over their archive.
+    """
+    if split_member_path(file_path)[1] is not None:
+        return None
+    return _read_input(file_path, validate)
+
+def _iter_prefetched(file_paths, validate, workers):
+    """Yield one future per input, in order, reading up to workers * 2 inputs ahead."""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    paths = iter(file_paths)
+    executor = ThreadPoolExecutor(workers)
+    pending = deque()
+    try:
+        for file_path in itertools.islice(paths, workers * 2):
+            pending.append(executor.submit(_prefetch_input, file_path, validate))
+        while pending:
+            future = pending.popleft()
+            for file_path in itertools.islice(paths, 1):
+                pending.append(executor.submit(_prefetch_input, file_path, validate))
+            yield future
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _header(created, count):
+    return (f"# Merged file created on {created}\n"
+            f"# Contains {count} text files\n\n").encode('utf-8')
+
+class _MergedContent:
+    """Content already written to a merge, for finding duplicate inputs.
+
+    Contents are bucketed by length, so an input is only hashed when some
+    earlier one had exactly its length, and earlier contents are hashed
+    (read back from the output, usually from the page cache) only when a
+    same-length input turns up. Merges without repeats hash nothing. An
+    output that can't be read back (compressed) has every input hashed.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.by_length = {}
+
+    def _hash_written(self, offset, length):
+        content_hash = new_hash()
+        for chunk in self.output.read_back(offset, length):
+            content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def find(self, file_path, data):
+        """Return (first, length, content_hash) for an input.
+
+        first is the (number, file_path) of the earlier input with the same
+        content, or None.
+        """
+        if data is not None:
+            length = len(data)
+        elif _is_streamed(file_path):
+            # The merged length is only known after reading it all
+            length, content_hash = _input_digest(file_path)
+        else:
+            length = os.stat(file_path).st_size
+        candidates = self.by_length.get(length)
+        if not candidates and self.output.can_read_back:
+            return None, length, None
+        if data is not None:
+            content_hash = _hash_bytes(data)
+        elif not _is_streamed(file_path):
+            content_hash = _input_digest(file_path)[1]
+        for candidate in candidates or ():
+            # candidate is [offset, content_hash, (number, file_path)]
+            if candidate[1] is None:
+                candidate[1] = self._hash_written(candidate[0], length)
+            if candidate[1] == content_hash:
+                return candidate[2], length, content_hash
+        return None, length, content_hash
+
+    def add(self, number, file_path, offset, length, content_hash=None):
+        self.by_length.setdefault(length, []).append([offset, content_hash, (number, file_path)])
+
+def _merge_inputs(output, file_paths, start, separator, add_headers, on_file, cancel_event,
+                  validate, workers, index, dedup=None, on_duplicate=None):
+    """Append file_paths[start:] to a merge output as merge_files lays them out.
+
+    Returns the number of inputs merged and, with index=True, their index
+    entries as (number, offset, length, file_path, stat) tuples.
+    """
+    merged_count = 0
+    entries = []
+    merged_content = _MergedContent(output) if dedup else None
+    pending_paths = file_paths[start:]
+    prefetched = _iter_prefetched(pending_paths, validate, workers) if workers > 1 else None
+    
+    def slot_header(i, file_path):
+        # Add separator between files (except before the first file)
+        text = separator if i > 0 else ""
+        
+        # Add file header if enabled
+        if add_headers:
+            file_name = os.path.basename(file_path)
+            text += f"### FILE {i+1}: {file_name} ###\n"
+        return text.encode('utf-8')
+    
+    try:
+        for i, file_path in enumerate(pending_paths, start):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            header = slot_header(i, file_path)
+            header_written = False
+            record = start_record('merge_input', file_path)
+            written = 0
+            
+            # Stream the file content
+            error = None
+            future = next(prefetched) if prefetched is not None else None
+            try:
+                # Stat before reading where we can, so a later change can't hide behind it
+                stat = _input_stat(file_path) if index else None
+                data = future.result() if future is not None else None
+                first = None
+                if merged_content is not None:
+                    if data is None and (is_notebook(file_path) or _is_streamed(file_path)):
+                        # Read once for both the comparison and the write
+                        data = _read_input(file_path, validate)
+                    lap(record, 'read')
+                    first, length, content_hash = merged_content.find(file_path, data)
+                    lap(record, 'dedup')
+                    if first is not None and dedup == 'reference':
+                        reference = f"### SAME AS FILE {first[0]}: {os.path.basename(first[1])} ###\n".encode('utf-8')
+                        if len(reference) >= length:
+                            # Shorter than its own reference: just write it
+                            first = None
+                elif data is not None:
+                    lap(record, 'read')
+                
+                if first is not None and dedup == 'skip':
+                    # Same content as an earlier input: leave the whole slot out
+                    saved = len(header) + length
+                else:
+                    output.write(header)
+                    header_written = True
+                    content_start = output.tell()
+                    if first is not None:
+                        # Same content as an earlier input: point back to it
+                        output.write(reference)
+                        written = len(reference)
+                        saved = length - len(reference)
+                    else:
+                        if data is None:
+                            _write_input(file_path, output, validate)
+                        else:
+                            output.write(data)
+                        content_end = output.tell()
+                        written = content_end - content_start
+                        entries.append((i + 1, content_start, content_end - content_start, file_path, stat))
+                        if merged_content is not None:
+                            # A file that changed size while being copied keeps no hash
+                            merged_content.add(i + 1, file_path, content_start, content_end - content_start,
+                                               content_hash if content_end - content_start == length else None)
+                if first is not None and record is not None:
+                    record['duplicate_of'] = first[1]
+                if first is not None and on_duplicate is not None:
+                    on_duplicate(i, first[0] - 1, saved)
+                merged_count += 1
+                lap(record, 'write')
+            except Exception as e:
+                error = f"Error reading file {file_path}:\n{str(e)}"
+                finish_record(record, e)
+                record = None
+                if not header_written:
+                    output.write(header)
+                    content_start = output.tell()
+                # Drop anything written before the failure
+                if not output.discard_after(content_start):
+                    raise Exception(f"{error}\nPart of it was already compressed into the "
+                                    f"output, so the merge was stopped.")
+            finish_record(record, bytes_out=written)
+            
+            if on_file is not None:
+                on_file(i, error)
+    finally:
+        if prefetched is not None:
+            prefetched.close()
+    return merged_count, entries
+
+def merge_files(file_paths, output_path, separator="\n", add_headers=True,
+                on_file=None, cancel_event=None, validate=False, workers=1, index=False,
+                dedup=None, on_duplicate=None, compression=None, compression_level=None,
+                on_complete=None):
+    """Merge text files into output_path in the given order.
+
+    Inputs are streamed as raw bytes, so memory use does not depend on file
+    size. With validate=True each input is also checked to be valid UTF-8,
+    and files that are not are left out of the merge. Jupyter notebooks
+    (.ipynb) are merged as their extracted code cells, the same text the
+    notebook converter would write, without any intermediate file.
+
+    With workers > 1, inputs are read ahead on that many threads, which hides
+    open/read latency when merging many small files. Output is written in
+    the same order and is byte-identical to the serial path; at most
+    workers * 2 inputs are buffered, text files of up to PREFETCH_MAX_BYTES
+    each and notebooks as their extracted code.
+
+    With index=True, a sidecar (see write_index) records where each input's
+    content landed, so single entries can later be extracted or verified
+    without scanning the merged file, and update_merge can rewrite only
+    what changed.
+
+    With dedup set to one of DEDUP_MODES, an input whose content is byte for
+    byte the same as an earlier input's is either left out entirely ('skip')
+    or written as a "### SAME AS FILE n: name ###" line ('reference').
+    Duplicates are found with BLAKE2b, but only inputs sharing a length with
+    an earlier one are ever hashed. on_duplicate(index, first_index,
+    saved_bytes) is called for each duplicate. dedup can't be combined with
+    index, since an index entry needs the content in place.
+
+    Inputs with a codec suffix (.gz, .bz2, .xz, .zst) are decompressed as
+    they are read. The output is compressed with compression (one of
+    converter_core.COMPRESSION_CODECS), or else the codec named by
+    output_path's suffix, at compression_level. A compressed output is
+    written in one streaming pass, but it can't carry an index, and a text
+    input that fails part-way through (only possible with validate=True or
+    a read error) stops the merge instead of being skipped.
+    on_complete(merged_bytes, output_bytes) is called at the end with the
+    uncompressed and on-disk sizes.
+
+    An input can also be an archive member, "<archive>::<member>" (see
+    expand_archives); members are read straight out of the archive, and
+    consecutive members of one archive in stored order cost a single
+    sequential pass over it.
+
+    on_file(index, error) is called after each input, with error set to a
+    message if the file could not be read; such files are skipped. Stops
+    early when cancel_event is set; the output (and index) then hold the
+    inputs merged so far. Returns the number of files merged.
+    """
+    if dedup is not None and dedup not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode {dedup!r}; expected one of {', '.join(DEDUP_MODES)}")
+    if dedup and index:
+        raise ValueError("dedup can't be combined with an index")
+    if compression is None:
+        compression = compression_for_path(output_path)
+    if compression and index:
+        raise ValueError("An index needs an uncompressed output")
+    
+    # An index left by an earlier merge into output_path would describe
+    # other bytes; it is only rewritten below if this merge is indexed too
+    try:
+        os.remove(index_path(output_path))
+    except FileNotFoundError:
+        pass
+    
+    # Write timestamp at the top
+    created = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    record = start_record('merge', output_path)
+    
+    if compression:
+        with open_compressed(output_path, 'wb', compression, compression_level) as stream:
+            output = _CompressedOutput(stream)
+            output.write(_header(created, len(file_paths)))
+            merged_count, entries = _merge_inputs(output, file_paths, 0, separator, add_headers,
+                                                  on_file, cancel_event, validate, workers,
+                                                  index, dedup, on_duplicate)
+            merged_bytes = output.tell()
+    else:
+        # Opened for reading too, so dedup can hash content it has already written
+        with open(output_path, 'w+b', buffering=0) as outfile:
+            output = _FileOutput(outfile.fileno())
+            output.write(_header(created, len(file_paths)))
+            header_end = output.tell()
+            merged_count, entries = _merge_inputs(output, file_paths, 0, separator, add_headers,
+                                                  on_file, cancel_event, validate, workers,
+                                                  index, dedup, on_duplicate)
+            merged_bytes = output.tell()
+    lap(record, 'inputs')
+    if on_complete is not None:
+        on_complete(merged_bytes, os.path.getsize(output_path))
+    
+    if index:
+        options = {'separator': separator, 'add_headers': add_headers, 'validate': validate}
+        write_index(output_path, _index_rows(output_path, entries),
+                    created=created, header_end=header_end, options=options)
+        lap(record, 'index')
+    finish_record(record, bytes_out=merged_bytes, files=len(file_paths), merged=merged_count)
+    return merged_count
+
+def _input_digest(file_path):
+    """Return (length, hash) of an input's merged content without writing it anywhere."""
+    if is_notebook(file_path):
+        data = extract_code_from_notebook(file_path).encode('utf-8')
+        return len(data), _hash_bytes(data)
+    content_hash = new_hash()
+    length = 0
+    with _open_text(file_path) as f:
+        while chunk := f.read(COPY_CHUNK_SIZE):
+            content_hash.update(chunk)
+            length += len(chunk)
+    return length, content_hash.hexdigest()
+
+def _unchanged_entry(entry, file_path):
+    """Return entry, refreshed if only the input's timestamps moved, or None if its content changed."""
+    try:
+        stat = _input_stat(file_path)
+    except OSError:
+        return None
+    if entry['path'] != os.path.abspath(file_path):
+        return None
+    if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry
+    try:
+        if _input_digest(file_path)[1] != entry['hash']:
+            return None
+    except Exception:
+        return None
+    return dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+def update_merge(file_paths, output_path, separator="\n", add_headers=True,
+                 on_file=None, cancel_event=None, validate=False, workers=1):
+    """Bring an indexed merge up to date with file_paths, rewriting only what changed.
+
+    The index written by merge_files(index=True) is compared with the new
+    input list. The longest prefix of inputs that are in the same position
+    with unchanged content is kept in place: an input whose size and mtime
+    match its entry is trusted, one whose stat changed is re-hashed. The
+    output is truncated after that prefix and only the remaining inputs are
+    written, so appending files or editing one near the end costs about as
+    much as merging those files alone. The "Contains N" header line is
+    patched in place, and the original creation time is kept.
+
+    Falls back to a full merge_files when there is no usable index, the
+    merged file was modified since it was indexed, the separator, header or
+    validation options differ, or the header would change length.
+
+    on_file and cancel_event behave as for merge_files; on_file is called
+    for kept inputs too. Returns (merged_count, kept_count). The index is
+    removed while the output is being modified and rewritten at the end.
+    A cancelled update keeps the inputs it got through, with a matching
+    index, so the next update carries on from there.
+    """
+    def full_merge():
+        merged_count = merge_files(file_paths, output_path, separator, add_headers, on_file,
+                                   cancel_event, validate, workers, index=True)
+        return merged_count, 0
+    
+    options = {'separator': separator, 'add_headers': add_headers, 'validate': validate}
+    try:
+        index_data = _read_index(output_path)
+        merged_stat = os.stat(output_path)
+    except (OSError, ValueError):
+        return full_merge()
+    if (index_data.get('options') != options
+            or index_data['merged_size'] != merged_stat.st_size
+            or index_data['merged_mtime_ns'] != merged_stat.st_mtime_ns):
+        return full_merge()
+    
+    header = _header(index_data['created'], len(file_paths))
+    header_end = index_data['header_end']
+    if len(header) != header_end:
+        return full_merge()
+    
+    # Longest prefix of inputs merged in the same slot with the same content
+    record = start_record('merge', output_path)
+    old_entries = _entries_from_index(index_data)
+    kept = []
+    for i, file_path in enumerate(file_paths[:len(old_entries)]):
+        entry = old_entries[i]
+        if entry['number'] != i + 1:
+            break
+        entry = _unchanged_entry(entry, file_path)
+        if entry is None:
+            break
+        kept.append(entry)
+    resume_at = kept[-1]['offset'] + kept[-1]['length'] if kept else header_end
+    lap(record, 'check')
+    
+    os.remove(index_path(output_path))
+    with open(output_path, 'r+b', buffering=0) as outfile:
+        output = _FileOutput(outfile.fileno())
+        os.pwrite(output.fd, header, 0)
+        output.discard_after(resume_at)
+        if on_file is not None:
+            for i in range(len(kept)):
+                on_file(i, None)
+        merged_count, entries = _merge_inputs(output, file_paths, len(kept), separator,
+                                              add_headers, on_file, cancel_event, validate,
+                                              workers, True)
+        merged_bytes = output.tell()
+    lap(record, 'inputs')
+    
+    rows = [[entry[field] for field in INDEX_FIELDS] for entry in kept]
+    write_index(output_path, rows + _index_rows(output_path, entries),
+                created=index_data['created'], header_end=header_end, options=options)
+    lap(record, 'index')
+    finish_record(record, bytes_out=merged_bytes - resume_at, files=len(file_paths),
+                  merged=len(kept) + merged_count, kept=len(kept))
+    return len(kept) + merged_count, len(kept)
+
+def index_path(merged_path):
+    """Return the path of the index sidecar for a merged file."""
+    return merged_path + INDEX_SUFFIX
+
+def _hash_bytes(data):
+    content_hash = new_hash()
+    content_hash.update(data)
+    return content_hash.hexdigest()
+
+def _map_file(f):
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _index_rows(merged_path, entries):
+    """Turn merge entries into index rows, hashing their content from the merged file."""
+    if not entries:
+        return []
+    with open(merged_path, 'rb') as f, _map_file(f) as mapped:
+        view = memoryview(mapped)
+        rows = [[number, offset, length, os.path.basename(file_path), os.path.abspath(file_path),
+                 _hash_bytes(view[offset:offset + length]), stat.st_size, stat.st_mtime_ns]
+                for number, offset, length, file_path, stat in entries]
+        view.release()
+    return rows
+
+def write_index(merged_path, rows, created, header_end, options):
+    """Write the index sidecar for a merged file.
+
+    Each row holds an input's FILE header number, the offset and length of
+    its content in the merged file, its name and absolute path, a BLAKE2b
+    hash of the content and the input's size and mtime when it was merged
+    (see INDEX_FIELDS). The merged file's own size and mtime, its creation
+    time, where the header ends and the merge options are stored alongside,
+    which is what update_merge needs to tell whether the output can be
+    updated in place.
+    """
+    merged_stat = os.stat(merged_path)
+    index_data = {
+        'version': INDEX_VERSION,
+        'merged_size': merged_stat.st_size,
+        'merged_mtime_ns': merged_stat.st_mtime_ns,
+        'created': created,
+        'header_end': header_end,
+        'options': options,
+        'fields': INDEX_FIELDS,
+        'entries': rows,
+    }
+    temp_path, target_path = make_temp_file(index_path(merged_path))
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            # dumps uses the C encoder; dump(f) would encode in pure Python
+            f.write(json.dumps(index_data, separators=(',', ':')))
+        os.replace(temp_path, target_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def _read_index(merged_path):
+    with open(index_path(merged_path), 'r', encoding='utf-8') as f:
+        index_data = json.load(f)
+    if index_data.get('version') != INDEX_VERSION:
+        raise ValueError(f"Unsupported index version in {index_path(merged_path)}")
+    return index_data
+
+def _entries_from_index(index_data):
+    fields = index_data['fields']
+    return [dict(zip(fields, row)) for row in index_data['entries']]
+
+def load_index(merged_path):
+    """Load the index of a merged file as a list of entry dicts, in merge order.
+
+    Raises ValueError if the merged file's size or mtime no longer match the
+    index, i.e. it was rewritten or edited after it was indexed.
+    """
+    index_data = _read_index(merged_path)
+    merged_stat = os.stat(merged_path)
+    if (index_data['merged_size'] != merged_stat.st_size
+            or index_data['merged_mtime_ns'] != merged_stat.st_mtime_ns):
+        raise ValueError(f"{index_path(merged_path)} is out of date: {merged_path} "
+                         f"changed after it was indexed")
+    return _entries_from_index(index_data)
+
+def find_entry(entries, key):
+    """Find an index entry by FILE number (int or digit string), file name or path."""
+    if isinstance(key, int) or key.isdigit():
+        number = int(key)
+        # Entries are in FILE order, so the number is usually the position
+        if 0 < number <= len(entries) and entries[number - 1]['number'] == number:
+            return entries[number - 1]
+        for entry in entries:
+            if entry['number'] == number:
+                return entry
+    else:
+        for entry in entries:
+            if key in (entry['name'], entry['path']):
+                return entry
+    raise KeyError(f"No entry {key!r} in the index")
+
+def extract_entry(merged_path, key, entries=None):
+    """Return the content of one merged input as bytes, read directly at its offset."""
+    entry = find_entry(entries if entries is not None else load_index(merged_path), key)
+    if not entry['length']:
+        return b''
+    with open(merged_path, 'rb') as f, _map_file(f) as mapped:
+        return mapped[entry['offset']:entry['offset'] + entry['length']]
+
+def verify_entries(merged_path, keys=None):
+    """Check merged content against the index hashes.
+
+    Returns the entries that don't match, either because their bytes changed
+    or because the merged file is shorter than the index expects. Checks
+    every entry unless keys are given. Unlike load_index, this doesn't
+    refuse an index whose merged file changed, since that is what it checks.
+    """
+    entries = _entries_from_index(_read_index(merged_path))
+    selected = entries if keys is None else [find_entry(entries, key) for key in keys]
+    failed = []
+    with open(merged_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return [entry for entry in selected if entry['length']]
+        with _map_file(f) as mapped:
+            view = memoryview(mapped)
+            for entry in selected:
+                end = entry['offset'] + entry['length']
+                if end > size or _hash_bytes(view[entry['offset']:end]) != entry['hash']:
+                    failed.append(entry)
+            view.release()
+    return failed
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""Parallel and incremental merges must write the same bytes as a serial full merge."""
+import json
+import os
+
+import pytest
+
+from merger_core import extract_entry, load_index, merge_files, update_merge, verify_entries
+
+NOTEBOOK = {
+    "cells": [
+        {"cell_type": "code", "metadata": {}, "outputs": [], "source": ["import os\n", "print(1)"]},
+        {"cell_type": "markdown", "metadata": {}, "source": "# Notes"},
+        {"cell_type": "code", "metadata": {}, "outputs": [], "source": "x = 2\n"},
+    ],
+    "metadata": {},
+    "nbformat": 4,
+    "nbformat_minor": 5,
+}
+
+def body(path):
+    """The merged file after its first line, which holds the creation time."""
+    with open(path, 'rb') as f:
+        f.readline()
+        return f.read()
+
+@pytest.fixture
+def inputs(tmp_path):
+    source = tmp_path / 'inputs'
+    source.mkdir()
+    paths = []
+    for i in range(12):
+        path = source / f'file{i:02}.txt'
+        # Empty, unterminated and large inputs alongside ordinary ones
+        content = ('' if i == 3 else f'line {i}\n' * (i * 40)
+                   + ('no newline' if i % 4 == 1 else '')
+                   + ('x' * (3 << 20) if i == 7 else ''))
+        path.write_text(content, encoding='utf-8')
+        paths.append(str(path))
+    notebook = source / 'notes.ipynb'
+    notebook.write_text(json.dumps(NOTEBOOK), encoding='utf-8')
+    paths.insert(5, str(notebook))
+    return paths
+
+@pytest.mark.parametrize('add_headers', [True, False])
+@pytest.mark.parametrize('separator', ['\n', '\n---\n', ''])
+def test_parallel_merge_is_byte_identical(tmp_path, inputs, separator, add_headers):
+    serial = tmp_path / 'serial.txt'
+    parallel = tmp_path / 'parallel.txt'
+    assert merge_files(inputs, str(serial), separator, add_headers, workers=1) == len(inputs)
+    assert merge_files(inputs, str(parallel), separator, add_headers, workers=4) == len(inputs)
+    assert body(serial) == body(parallel)
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_index_entries_extract_their_inputs(tmp_path, inputs, workers):
+    merged = str(tmp_path / 'merged.txt')
+    merge_files(inputs, merged, workers=workers, index=True)
+    entries = load_index(merged)
+    assert [entry['path'] for entry in entries] == [os.path.abspath(path) for path in inputs]
+    for entry, path in zip(entries, inputs):
+        if path.endswith('.ipynb'):
+            expected = b"import os\nprint(1)\n\nx = 2\n"
+        else:
+            with open(path, 'rb') as f:
+                expected = f.read()
+        assert extract_entry(merged, entry['number'], entries) == expected
+    assert verify_entries(merged) == []
+
+def edit(path, content):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(content)
+
+@pytest.mark.parametrize('workers', [1, 4])
+@pytest.mark.parametrize('change', ['append', 'edit_last', 'edit_middle', 'remove', 'reorder'])
+def test_update_matches_fresh_merge(tmp_path, inputs, change, workers):
+    updated = str(tmp_path / 'updated.txt')
+    fresh = str(tmp_path / 'fresh.txt')
+    merge_files(inputs, updated, workers=workers, index=True)
+    if change == 'append':
+        extra = tmp_path / 'inputs' / 'extra.txt'
+        extra.write_text('appended\n', encoding='utf-8')
+        inputs = inputs + [str(extra)]
+        expected_kept = len(inputs) - 1
+    elif change == 'edit_last':
+        edit(inputs[-1], 'changed\n')
+        expected_kept = len(inputs) - 1
+    elif change == 'edit_middle':
+        edit(inputs[4], 'changed\n')
+        expected_kept = 4
+    elif change == 'remove':
+        inputs = inputs[:8] + inputs[9:]
+        expected_kept = 8
+    else:
+        inputs = [inputs[1], inputs[0]] + inputs[2:]
+        expected_kept = 0
+    
+    merged_count, kept_count = update_merge(inputs, updated, workers=workers)
+    assert (merged_count, kept_count) == (len(inputs), expected_kept)
+    merge_files(inputs, fresh, workers=1, index=True)
+    assert body(updated) == body(fresh)
+    assert verify_entries(updated) == []
+    old_rows = [{k: v for k, v in entry.items() if k != 'mtime_ns'} for entry in load_index(fresh)]
+    new_rows = [{k: v for k, v in entry.items() if k != 'mtime_ns'} for entry in load_index(updated)]
+    assert new_rows == old_rows
+
+def test_update_without_index_is_a_full_merge(tmp_path, inputs):
+    merged = str(tmp_path / 'merged.txt')
+    merge_files(inputs, merged)
+    assert update_merge(inputs, merged) == (len(inputs), 0)
+    assert verify_entries(merged) == []
\ No newline at end of file
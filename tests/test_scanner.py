@@ -0,0 +1,146 @@
+"""The streaming scanner must read every notebook exactly as json.loads does."""
+import io
+import json
+import mmap
+
+import pytest
+
+from converter_cells import build_extractor
+from converter_core import (
+    _MappedNotebookReader,
+    _NotebookReader,
+    _extract_mapped_code,
+    _iter_cells,
+    _iter_loaded_cells,
+    _write_cells,
+)
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 65536]
+
+# Skipped values that exercise every scalar, escape and nesting form
+OUTPUTS = [
+    {"output_type": "stream", "name": "stdout", "text": ["a\tb\n", "é中 😀\n"]},
+    {"output_type": "execute_result", "execution_count": 3,
+     "data": {"text/plain": ["'\\\\\"quoted\\\"'"], "image/png": "iVBORw0KGgo" * 50},
+     "metadata": {"n": [0, -1, 1.5, -2e-3, 3E+10, True, False, None, [], {}]}},
+    {"output_type": "error", "ename": "E", "evalue": "\\u0000 \b\f\r\n\"/",
+     "traceback": ["\x1b[31m", "}]{[", ""]},
+]
+
+NOTEBOOK = {
+    "cells": [
+        {"cell_type": "markdown", "metadata": {"tags": ["intro"]}, "source": ["# Title\n", "text"]},
+        {"cell_type": "code", "execution_count": 1, "metadata": {"tags": ["keep"]},
+         "outputs": OUTPUTS, "source": ["import os\n", "print('\\u00e9')"]},
+        {"outputs": [], "source": "x = {'a': [1, 2]}\n", "cell_type": "code", "metadata": {}},
+        {"cell_type": "raw", "source": [], "metadata": {}},
+        {"cell_type": "code", "source": "", "metadata": {}, "attachments": {"a.png": {"image/png": "AAAA"}}},
+    ],
+    "metadata": {"kernelspec": {"name": "python3"}, "language_info": {"version": "3.12"}},
+    "nbformat": 4,
+    "nbformat_minor": 5,
+}
+
+def encodings():
+    compact = json.dumps(NOTEBOOK, separators=(',', ':')).encode('utf-8')
+    yield compact
+    yield json.dumps(NOTEBOOK, indent=1).encode('utf-8')
+    yield json.dumps(NOTEBOOK, indent=2, ensure_ascii=False).encode('utf-8')
+    yield b'\xef\xbb\xbf' + compact
+    yield b' \r\n\t' + compact + b'\n\n'
+
+EXTRACTORS = [
+    None,
+    build_extractor('jsonl', cell_types=('code', 'markdown', 'raw')),
+    build_extractor('text', tags=['keep'], strip_magic_lines=True, cell_markers=True),
+]
+
+def scanned(data, chunk_size, extractor):
+    reader = _NotebookReader(io.BytesIO(data), chunk_size=chunk_size)
+    if extractor is None:
+        return list(_iter_cells(reader))
+    return list(_iter_cells(reader, extractor))
+
+def loaded(data, extractor):
+    notebook = json.loads(data)
+    if extractor is None:
+        return list(_iter_loaded_cells(notebook))
+    return list(_iter_loaded_cells(notebook, extractor))
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('data', list(encodings()))
+@pytest.mark.parametrize('extractor', EXTRACTORS)
+def test_scanner_matches_json_loads(data, chunk_size, extractor):
+    assert scanned(data, chunk_size, extractor) == loaded(data, extractor)
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_null_and_unknown_cell_types_are_skipped(chunk_size):
+    data = (b'{"cells": [{"cell_type": null, "source": "a"}, {"source": "b", "cell_type": "code"},'
+            b' {"cell_type": ["code"], "source": "c"}]}')
+    assert scanned(data, chunk_size, None) == loaded(data, None) == ['b']
+
+@pytest.mark.parametrize('data, error', [
+    (b'{"cells": [{"source": "a"}]}', KeyError),
+    (b'{"cells": [{"cell_type": "code"}]}', KeyError),
+    (b'{"metadata": {}}', ValueError),
+])
+def test_missing_keys_fail_like_a_full_parse(data, error):
+    for chunk_size in CHUNK_SIZES:
+        with pytest.raises(error):
+            scanned(data, chunk_size, None)
+    with pytest.raises(error):
+        loaded(data, None)
+
+# Each is spliced in as the outputs of a code cell, which the scanner skips.
+# A missing comma or colon and invalid UTF-8 in a skipped value are not
+# caught (see _iter_cells), so they are not listed here.
+MALFORMED_OUTPUTS = [
+    b'[tru]', b'[nul]', b'[falsey]', b'[01]', b'[-]', b'[1.]', b'[1e]', b'[.5]', b'[+1]',
+    b'["\\x"]', b'["\\u12"]', b'["\\u12g4"]', b'["a\nb"]', b'["a\tb"]', b'["\x00"]',
+    b'["\x1f"]', b'["\\"]', b'["abc]', b'[1}', b'{"a": 1]', b'[[1, 2]',
+]
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('outputs', [b'[NaN, Infinity, -Infinity]', b'[-0.0e0, 1E-0]', b'["\\ud800"]'])
+def test_values_json_loads_accepts_are_skipped(outputs, chunk_size):
+    data = b'{"cells": [{"cell_type": "code", "outputs": ' + outputs + b', "source": "x"}]}'
+    assert scanned(data, chunk_size, None) == loaded(data, None) == ['x']
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('outputs', MALFORMED_OUTPUTS)
+def test_malformed_skipped_values_are_rejected(outputs, chunk_size):
+    data = b'{"cells": [{"cell_type": "code", "outputs": ' + outputs + b', "source": "x"}]}'
+    with pytest.raises(ValueError):
+        loaded(data, None)
+    with pytest.raises(ValueError):
+        scanned(data, chunk_size, None)
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('data', [
+    b'{"cells": []} x',
+    b'{"cells": []}{}',
+    b'{"cells": []',
+    b'{"cells": [}',
+    b'{"cells": [], "cells": []}',
+    b'{"cells": [{"cell_type": "code", "source": "a", "source": "b"}]}',
+    b'{"cells": [{"cell_type": "code", "source": "a\\q"}]}',
+    b'',
+])
+def test_malformed_notebooks_are_rejected(data, chunk_size):
+    with pytest.raises(ValueError):
+        scanned(data, chunk_size, None)
+
+@pytest.mark.parametrize('data', list(encodings()))
+def test_mapped_notebook_matches_json_loads(tmp_path, data):
+    path = tmp_path / 'notebook.ipynb'
+    path.write_bytes(data)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        assert list(_iter_cells(_MappedNotebookReader(mapping))) == loaded(data, None)
+        assert _extract_mapped_code(mapping) == _write_cells(loaded(data, None))
+
+def test_mapped_notebook_errors_are_not_recovered(tmp_path):
+    path = tmp_path / 'notebook.ipynb'
+    path.write_bytes(b'{"cells": [{"cell_type": "code", "outputs": [tru], "source": "x"}]}')
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        with pytest.raises(ValueError):
+            _extract_mapped_code(mapping)
\ No newline at end of file
@@ -5,13 +5,45 @@ This program allows users to merge multiple text files into a single output file
 """
 
 import os
+import queue
 import sys
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-from datetime import datetime
+import threading
+import time
+
+import instrumentation
+from converter_core import COMPRESSION_CODECS, is_archive_path
+from file_list import FileList, FileListView
+from merger_core import (
+    DEDUP_MODES,
+    INDEX_SUFFIX,
+    expand_archives,
+    extract_entry,
+    index_path,
+    load_index,
+    merge_files,
+    update_merge,
+    verify_entries,
+)
+
+# tkinter is only imported when the GUI starts (see _import_tk), so
+# importing this module works on machines without Tk.
+tk = filedialog = messagebox = ttk = None
+
+# How often the GUI drains results from its worker thread, and how many per tick
+POLL_INTERVAL_MS = 100
+POLL_BATCH_SIZE = 500
+
+# Reader threads used when "Read files in parallel" is checked
+MERGE_READ_WORKERS = 16
+
+def _import_tk():
+    global tk, filedialog, messagebox, ttk
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
 
 class TextFileMergerApp:
     def __init__(self, root):
+        _import_tk()
         self.root = root
         self.root.title("Text File Merger")
         self.root.geometry("700x500")
@@ -32,7 +64,7 @@ class TextFileMergerApp:
         # Description
         description = tk.Label(
             main_frame,
-            text="Select multiple text files to merge them into a single file.\n"
+            text="Select multiple text files or Jupyter notebooks to merge them into a single file.\n"
                  "Files will be merged in the order they appear in the list.",
             justify=tk.CENTER
         )
@@ -125,6 +157,42 @@ class TextFileMergerApp:
         )
         self.add_headers_check.grid(row=0, column=3, padx=5, sticky=tk.W)
         
+        # Validate UTF-8 checkbox (inputs are otherwise copied byte for byte)
+        self.validate_var = tk.BooleanVar(value=False)
+        self.validate_check = tk.Checkbutton(
+            options_frame,
+            text="Validate UTF-8",
+            variable=self.validate_var
+        )
+        self.validate_check.grid(row=1, column=3, padx=5, sticky=tk.W)
+        
+        # Parallel reads checkbox (output is identical either way)
+        self.parallel_var = tk.BooleanVar(value=False)
+        self.parallel_check = tk.Checkbutton(
+            options_frame,
+            text="Read files in parallel",
+            variable=self.parallel_var
+        )
+        self.parallel_check.grid(row=1, column=0, columnspan=2, padx=(0, 5), sticky=tk.W)
+        
+        # Index sidecar checkbox (byte offsets for the list/extract/verify commands)
+        self.index_var = tk.BooleanVar(value=False)
+        self.index_check = tk.Checkbutton(
+            options_frame,
+            text="Write index file",
+            variable=self.index_var
+        )
+        self.index_check.grid(row=1, column=2, padx=5, sticky=tk.W)
+        
+        # Incremental update checkbox (reuses the unchanged start of an indexed merge)
+        self.update_var = tk.BooleanVar(value=False)
+        self.update_check = tk.Checkbutton(
+            options_frame,
+            text="Update existing merge",
+            variable=self.update_var
+        )
+        self.update_check.grid(row=2, column=0, columnspan=2, padx=(0, 5), sticky=tk.W)
+        
         # Files listbox with scrollbar
         list_frame = tk.Frame(main_frame)
         list_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -146,6 +214,7 @@ class TextFileMergerApp:
         y_scrollbar.config(command=self.files_listbox.yview)
         x_scrollbar.config(command=self.files_listbox.xview)
         self.files_listbox.bind("<<ListboxSelect>>", self.on_file_select)
+        self.files_view = FileListView(self.files_listbox)
         
         # Status label
         self.status_label = tk.Label(
@@ -159,6 +228,10 @@ class TextFileMergerApp:
         )
         self.status_label.pack(fill=tk.X, pady=(10, 0))
         
+        # Progress bar
+        self.progress_bar = ttk.Progressbar(main_frame, mode='determinate')
+        self.progress_bar.pack(fill=tk.X, pady=(5, 0))
+        
         # Merge button
         self.merge_button = tk.Button(
             main_frame,
@@ -171,8 +244,20 @@ class TextFileMergerApp:
         )
         self.merge_button.pack(fill=tk.X, pady=(10, 0))
         
+        # Cancel button
+        self.cancel_button = tk.Button(
+            main_frame,
+            text="Cancel",
+            command=self.cancel_merge,
+            state=tk.DISABLED
+        )
+        self.cancel_button.pack(fill=tk.X, pady=(5, 0))
+        
         # Store file paths
-        self.file_paths = []
+        self.file_paths = FileList()
+        self.results = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
     
     def update_custom_separator(self, event=None):
         if self.separator_var.get() == "custom":
@@ -181,77 +266,97 @@ class TextFileMergerApp:
             self.custom_separator_entry.config(state=tk.DISABLED)
     
     def add_files(self):
-        filetypes = [("Text Files", "*.txt"), ("All Files", "*.*")]
+        filetypes = [("Text Files and Notebooks", "*.txt *.ipynb"), ("Text Files", "*.txt"),
+                     ("Jupyter Notebooks", "*.ipynb"),
+                     ("Compressed Files", "*.gz *.bz2 *.xz *.zst"),
+                     ("Archives", "*.zip *.tar *.tar.gz *.tgz *.tar.bz2 *.tbz2 *.tar.xz *.txz"),
+                     ("All Files", "*.*")]
         files = filedialog.askopenfilenames(
-            title="Select Text Files to Merge",
+            title="Select Files to Merge",
             filetypes=filetypes
         )
         
-        if files:
-            for file_path in files:
-                if file_path not in self.file_paths:
-                    self.file_paths.append(file_path)
-                    self.files_listbox.insert(tk.END, file_path)
-            
+        if not files:
+            return
+        if not any(is_archive_path(file_path) for file_path in files):
+            self._add_paths(files)
+            return
+        
+        # Archives are added as their members. Listing a compressed tar
+        # decompresses all of it, so it is done on a worker thread.
+        self.add_button.config(state=tk.DISABLED)
+        self.merge_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Reading archives...")
+        archive_results = queue.Queue()
+        
+        def expand():
+            try:
+                archive_results.put((expand_archives(files), None))
+            except Exception as e:
+                archive_results.put((None, str(e)))
+        
+        threading.Thread(target=expand, daemon=True).start()
+        self.root.after(POLL_INTERVAL_MS, self._poll_archives, archive_results)
+    
+    def _poll_archives(self, archive_results):
+        """Add the files from add_files' archive worker once it is done."""
+        try:
+            files, error = archive_results.get_nowait()
+        except queue.Empty:
+            self.root.after(POLL_INTERVAL_MS, self._poll_archives, archive_results)
+            return
+        self.add_button.config(state=tk.NORMAL)
+        if error:
             self.update_ui_state()
-            self.status_label.config(text=f"Added {len(files)} file(s). Total: {len(self.file_paths)}")
+            self.status_label.config(text="Could not read archive.")
+            messagebox.showerror("Error", f"Could not read archive: {error}")
+            return
+        self._add_paths(files)
+    
+    def _add_paths(self, files):
+        added = self.file_paths.extend(files)
+        self.files_view.append(added)
+        
+        self.update_ui_state()
+        self.status_label.config(text=f"Added {len(added)} file(s). Total: {len(self.file_paths)}")
     
     def remove_selected(self):
         selected_indices = self.files_listbox.curselection()
         if not selected_indices:
             return
         
-        # Remove in reverse order to maintain correct indices
-        for index in sorted(selected_indices, reverse=True):
-            self.files_listbox.delete(index)
-            self.file_paths.pop(index)
+        self.file_paths.remove(selected_indices)
+        self.files_view.delete(selected_indices)
         
         self.update_ui_state()
         self.status_label.config(text=f"Removed {len(selected_indices)} file(s). Remaining: {len(self.file_paths)}")
     
     def clear_all(self):
-        self.files_listbox.delete(0, tk.END)
+        self.files_view.set([])
         self.file_paths.clear()
         self.update_ui_state()
         self.status_label.config(text="All files cleared.")
     
     def move_up(self):
-        selected_indices = self.files_listbox.curselection()
-        if not selected_indices or 0 in selected_indices:
-            return
-        
-        # Only move the first selected item
-        index = selected_indices[0]
-        
-        # Swap items in both the listbox and file_paths
-        file_path = self.file_paths[index]
-        self.file_paths[index] = self.file_paths[index-1]
-        self.file_paths[index-1] = file_path
-        
-        # Update listbox
-        self.files_listbox.delete(index)
-        self.files_listbox.insert(index-1, file_path)
-        self.files_listbox.select_set(index-1)
-        self.files_listbox.see(index-1)
+        self.move_selected(-1)
     
     def move_down(self):
+        self.move_selected(1)
+    
+    def move_selected(self, offset):
+        """Move the selected files one place up (-1) or down (1), together."""
         selected_indices = self.files_listbox.curselection()
-        if not selected_indices or len(self.file_paths) - 1 in selected_indices:
+        moved_indices = self.file_paths.move(selected_indices, offset)
+        if moved_indices == list(selected_indices):
             return
         
-        # Only move the first selected item
-        index = selected_indices[0]
-        
-        # Swap items in both the listbox and file_paths
-        file_path = self.file_paths[index]
-        self.file_paths[index] = self.file_paths[index+1]
-        self.file_paths[index+1] = file_path
-        
-        # Update listbox
-        self.files_listbox.delete(index)
-        self.files_listbox.insert(index+1, file_path)
-        self.files_listbox.select_set(index+1)
-        self.files_listbox.see(index+1)
+        # Rewrite the rows between the first and last one that changed
+        first = min(selected_indices[0], moved_indices[0])
+        last = max(selected_indices[-1], moved_indices[-1])
+        self.files_view.show({index: (self.file_paths[index], None)
+                              for index in range(first, last + 1)})
+        self.files_view.select(moved_indices)
+        self.on_file_select()
     
     def on_file_select(self, event=None):
         selected = self.files_listbox.curselection()
@@ -260,11 +365,11 @@ class TextFileMergerApp:
         # Update button states based on selection
         self.remove_button.config(state=tk.NORMAL if has_selection else tk.DISABLED)
         
-        # For move up/down, we need single selection
-        if len(selected) == 1:
-            index = selected[0]
-            self.move_up_button.config(state=tk.NORMAL if index > 0 else tk.DISABLED)
-            self.move_down_button.config(state=tk.NORMAL if index < len(self.file_paths) - 1 else tk.DISABLED)
+        # The selection moves as a whole, so only an end of the list stops it
+        if has_selection:
+            self.move_up_button.config(state=tk.NORMAL if selected[0] > 0 else tk.DISABLED)
+            self.move_down_button.config(
+                state=tk.NORMAL if selected[-1] < len(self.file_paths) - 1 else tk.DISABLED)
         else:
             self.move_up_button.config(state=tk.DISABLED)
             self.move_down_button.config(state=tk.DISABLED)
@@ -303,58 +408,314 @@ class TextFileMergerApp:
         output_path = filedialog.asksaveasfilename(
             title="Save Merged File As",
             defaultextension=".txt",
-            filetypes=[("Text File", "*.txt"), ("All Files", "*.*")]
+            filetypes=[("Text File", "*.txt"),
+                       ("Compressed Text File", "*.txt.gz *.txt.bz2 *.txt.xz *.txt.zst"),
+                       ("All Files", "*.*")]
         )
         
         if not output_path:
             self.status_label.config(text="Merge cancelled.")
             return
         
+        # Merge on a background thread so the window stays responsive;
+        # results come back through self.results and are polled below.
+        self.cancel_event.clear()
+        self.merge_paths = list(self.file_paths)
+        self.merge_output_path = output_path
+        self.processed_count = 0
+        self.read_errors = []
+        self.start_time = time.perf_counter()
+        self.progress_bar.config(maximum=len(self.merge_paths), value=0)
+        self.set_busy(True)
+        self.status_label.config(text=f"Merging {len(self.merge_paths)} files...")
+        
+        self.worker = threading.Thread(
+            target=self._merge_worker,
+            args=(self.merge_paths, output_path, self.get_separator(),
+                  self.add_headers_var.get(), self.validate_var.get(),
+                  MERGE_READ_WORKERS if self.parallel_var.get() else 1,
+                  self.index_var.get(), self.update_var.get()),
+            daemon=True
+        )
+        self.worker.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll_results)
+    
+    def cancel_merge(self):
+        """Ask the background merge to stop after the current file."""
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Cancelling...")
+    
+    def _merge_worker(self, file_paths, output_path, separator, add_headers, validate, workers,
+                      index, update):
+        """Run merge_files (or update_merge) on the worker thread, reporting through self.results."""
+        processed = []  # one item per input done, kept or merged
+        
+        def on_file(i, error):
+            processed.append(i)
+            self.results.put(('file', i, error))
+        
         try:
-            with open(output_path, 'w', encoding='utf-8') as outfile:
-                separator = self.get_separator()
-                add_headers = self.add_headers_var.get()
-                
-                # Write timestamp at the top
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                outfile.write(f"# Merged file created on {timestamp}\n")
-                outfile.write(f"# Contains {len(self.file_paths)} text files\n\n")
-                
-                for i, file_path in enumerate(self.file_paths):
-                    # Add separator between files (except before the first file)
-                    if i > 0:
-                        outfile.write(separator)
-                    
-                    # Add file header if enabled
-                    if add_headers:
-                        file_name = os.path.basename(file_path)
-                        outfile.write(f"### FILE {i+1}: {file_name} ###\n")
-                    
-                    # Read and write file content
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as infile:
-                            content = infile.read()
-                            outfile.write(content)
-                    except Exception as e:
-                        messagebox.showwarning(
-                            "File Error", 
-                            f"Error reading file {file_path}:\n{str(e)}\n\nContinuing with other files."
-                        )
+            kept_count = 0
+            if update:
+                _, kept_count = update_merge(
+                    file_paths, output_path, separator, add_headers,
+                    on_file=on_file,
+                    cancel_event=self.cancel_event,
+                    validate=validate,
+                    workers=workers
+                )
+            else:
+                merge_files(
+                    file_paths, output_path, separator, add_headers,
+                    on_file=on_file,
+                    cancel_event=self.cancel_event,
+                    validate=validate,
+                    workers=workers,
+                    index=index
+                )
+            if len(processed) == len(file_paths):
+                # A cancel that came too late to stop anything
+                self.results.put(('done', kept_count, None))
+                return
+            if not update:
+                # Don't leave a truncated merge behind. An update keeps the
+                # inputs it got through, indexed, for the next one to resume
+                os.remove(output_path)
+                if index:
+                    os.remove(index_path(output_path))
+            self.results.put(('cancelled', kept_count, None))
+        except Exception as e:
+            self.results.put(('failed', None, str(e)))
+    
+    def _poll_results(self):
+        """Apply worker results to the UI; reschedules itself until the worker is done."""
+        finished = None
+        rows = {}
+        for _ in range(POLL_BATCH_SIZE):
+            try:
+                kind, index, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind != 'file':
+                finished = (kind, index, error)
+                break
             
+            self.processed_count += 1
+            # Show the per-file status in the list
+            status = "error" if error else "merged"
+            rows[index] = (f"{self.merge_paths[index]}  [{status}]", "red" if error else None)
+            if error:
+                self.read_errors.append(error)
+        self.files_view.show(rows)
+        
+        total = len(self.merge_paths)
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        self.progress_bar.config(value=self.processed_count)
+        
+        if finished is None:
+            self.status_label.config(
+                text=f"Merging {self.processed_count} of {total} "
+                     f"({self.processed_count / elapsed:.1f} files/s)"
+            )
+            self.root.after(POLL_INTERVAL_MS, self._poll_results)
+            return
+        
+        self.worker = None
+        self.set_busy(False)
+        kind, kept_count, error = finished
+        output_name = os.path.basename(self.merge_output_path)
+        rate = f"{self.processed_count / elapsed:.1f} files/s"
+        if kept_count:
+            rate += f", {kept_count} unchanged"
+        
+        if self.read_errors:
+            messagebox.showwarning(
+                "File Error", 
+                "\n\n".join(self.read_errors) + "\n\nThese files were skipped."
+            )
+        
+        if kind == 'failed':
+            messagebox.showerror("Error", f"Failed to merge files:\n{error}")
+            self.status_label.config(text="Merge failed. See error message.")
+        elif kind == 'cancelled':
+            self.status_label.config(text="Merge cancelled.")
+        else:
             messagebox.showinfo(
                 "Merge Complete", 
-                f"Successfully merged {len(self.file_paths)} files into:\n{output_path}"
+                f"Successfully merged {total} files into:\n{self.merge_output_path}"
             )
-            self.status_label.config(text=f"Merged {len(self.file_paths)} files to {os.path.basename(output_path)}")
+            self.status_label.config(text=f"Merged {total} files to {output_name} ({rate})")
+    
+    def set_busy(self, busy):
+        """Lock the file list and buttons while a merge is running."""
+        state = tk.DISABLED if busy else tk.NORMAL
+        self.add_button.config(state=state)
+        self.separator_dropdown.config(state=state)
+        self.add_headers_check.config(state=state)
+        self.validate_check.config(state=state)
+        self.parallel_check.config(state=state)
+        self.index_check.config(state=state)
+        self.update_check.config(state=state)
+        self.cancel_button.config(state=tk.NORMAL if busy else tk.DISABLED)
+        if busy:
+            for button in (self.remove_button, self.clear_button, self.move_up_button,
+                           self.move_down_button, self.merge_button):
+                button.config(state=tk.DISABLED)
+        else:
+            self.update_ui_state()
+
+def run_cli(argv):
+    """Merge files or work with merge indexes without the GUI. Returns the exit code."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge text files and notebooks into one file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    merge_parser = commands.add_parser("merge", help="merge files in the given order")
+    merge_parser.add_argument("inputs", nargs="+",
+                              help="text files or notebooks to merge; .zip/.tar[.gz|.bz2|.xz] "
+                                   "archives are merged member by member without extracting")
+    merge_parser.add_argument("-o", "--output", required=True, help="merged output file")
+    merge_parser.add_argument("--separator", default="\\n",
+                              help="text written between files; backslash escapes are "
+                                   "interpreted (default: '\\n')")
+    merge_parser.add_argument("--no-headers", action="store_true",
+                              help="don't write '### FILE i: name ###' headers")
+    merge_parser.add_argument("--validate", action="store_true",
+                              help="skip text files that are not valid UTF-8")
+    merge_parser.add_argument("-j", "--jobs", type=int, default=1,
+                              help="threads reading inputs ahead (default: 1)")
+    merge_parser.add_argument("--index", action="store_true",
+                              help=f"write a byte-offset index to OUTPUT{INDEX_SUFFIX}")
+    merge_parser.add_argument("--dedup", choices=DEDUP_MODES,
+                              help="for inputs whose content was already merged, leave them out "
+                                   "(skip) or write a 'SAME AS FILE n' line (reference)")
+    merge_parser.add_argument("--compress", choices=COMPRESSION_CODECS,
+                              help="compress the output (default: by OUTPUT's suffix, e.g. .gz "
+                                   "or .zst); compressed inputs are always read transparently")
+    merge_parser.add_argument("--compression-level", type=int, metavar="N",
+                              help="codec compression level (default: gzip 6, bz2 9, xz 6, zstd 3)")
+    merge_parser.add_argument("--update", action="store_true",
+                              help="update an indexed OUTPUT in place, rewriting only from the "
+                                   "first added, moved or changed input (implies --index)")
+    merge_parser.add_argument("--trace", metavar="FILE",
+                              help="write a JSON-lines record of every input merged (stage "
+                                   "timings, bytes, peak memory) and print a summary with "
+                                   "percentiles")
+    merge_parser.add_argument("--trace-memory", action="store_true",
+                              help="also record each input's Python allocation peak with "
+                                   "tracemalloc (slows merging down)")
+    merge_parser.add_argument("--profile", metavar="FILE",
+                              help="run cProfile on the merging thread and write its stats to FILE")
+    
+    list_parser = commands.add_parser("list", help="list the entries of an indexed merged file")
+    list_parser.add_argument("merged", help="merged file")
+    
+    extract_parser = commands.add_parser("extract", help="extract one entry of an indexed merged file")
+    extract_parser.add_argument("merged", help="merged file")
+    extract_parser.add_argument("key", help="FILE number, file name or original path")
+    extract_parser.add_argument("-o", "--output", help="write here instead of standard output")
+    
+    verify_parser = commands.add_parser("verify", help="check entries against their index hashes")
+    verify_parser.add_argument("merged", help="merged file")
+    verify_parser.add_argument("keys", nargs="*", help="entries to check (default: all)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "merge":
+            import codecs
             
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to merge files:\n{str(e)}")
-            self.status_label.config(text="Merge failed. See error message.")
+            duplicate_count = 0
+            bytes_saved = 0
+            sizes = None
+            
+            def report(index, error):
+                if error:
+                    print(f"ERROR {error}", file=sys.stderr)
+            
+            def report_duplicate(index, first_index, saved):
+                nonlocal duplicate_count, bytes_saved
+                duplicate_count += 1
+                bytes_saved += saved
+            
+            def report_sizes(merged_bytes, output_bytes):
+                nonlocal sizes
+                sizes = (merged_bytes, output_bytes)
+            
+            if args.trace_memory and not args.trace:
+                parser.error("--trace-memory needs --trace")
+            if args.trace or args.profile:
+                instrumentation.enable(args.trace, args.trace_memory, args.profile)
+            start = time.perf_counter()
+            args.inputs = expand_archives(args.inputs)
+            separator = codecs.decode(args.separator, 'unicode_escape')
+            kept_count = 0
+            try:
+                if args.update:
+                    merged_count, kept_count = update_merge(
+                        args.inputs, args.output, separator, not args.no_headers,
+                        on_file=report, validate=args.validate, workers=args.jobs)
+                else:
+                    merged_count = merge_files(args.inputs, args.output, separator,
+                                               not args.no_headers, on_file=report,
+                                               validate=args.validate, workers=args.jobs,
+                                               index=args.index, dedup=args.dedup,
+                                               on_duplicate=report_duplicate,
+                                               compression=args.compress,
+                                               compression_level=args.compression_level,
+                                               on_complete=report_sizes)
+            finally:
+                recorder = instrumentation.disable()
+            print(f"Merged {merged_count} of {len(args.inputs)} files into {args.output} "
+                  f"({kept_count} unchanged)")
+            if sizes is not None:
+                merged_bytes, output_bytes = sizes
+                elapsed = max(time.perf_counter() - start, 1e-9)
+                print(f"Wrote {merged_bytes / 1e6:.2f} MB of text as {output_bytes / 1e6:.2f} MB "
+                      f"(ratio {merged_bytes / max(output_bytes, 1):.2f}, "
+                      f"{merged_bytes / elapsed / 1e6:.1f} MB/s)")
+            if args.dedup:
+                print(f"{duplicate_count} duplicates, {bytes_saved / 1e6:.2f} MB saved")
+            if recorder is not None:
+                print("\n".join(recorder.summary.format()))
+            if args.profile:
+                print(f"Profile written to {args.profile} (see python -m pstats)")
+            return 0 if merged_count == len(args.inputs) else 1
+        
+        if args.command == "list":
+            for entry in load_index(args.merged):
+                print(f"{entry['number']:>6}  {entry['offset']:>12}  {entry['length']:>10}  "
+                      f"{entry['name']}  ({entry['path']})")
+            return 0
+        
+        if args.command == "extract":
+            data = extract_entry(args.merged, args.key)
+            if args.output:
+                with open(args.output, 'wb') as f:
+                    f.write(data)
+            else:
+                sys.stdout.buffer.write(data)
+            return 0
+        
+        failed = verify_entries(args.merged, args.keys or None)
+        for entry in failed:
+            print(f"MISMATCH {entry['number']}: {entry['name']}", file=sys.stderr)
+        print(f"{len(failed)} mismatched entries")
+        return 1 if failed else 0
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR {e}", file=sys.stderr)
+        return 1
 
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    _import_tk()
+    instrumentation.enable_from_environment()
     root = tk.Tk()
     app = TextFileMergerApp(root)
     root.mainloop()
+    instrumentation.disable()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file